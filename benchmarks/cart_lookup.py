@@ -0,0 +1,97 @@
+"""Active-cart lookup latency with and without the partial unique index.
+
+Seeds ``--carts`` carts (one active cart per user, the rest historical) into a
+throwaway test database, then times ``Cart.objects.active().get(user_id=...)``
+with the ``unique_active_cart_per_user`` index in place and again with it
+dropped inside a rolled-back transaction.
+
+    python -m benchmarks.cart_lookup --carts 1000000
+    BENCH_DATABASE=sqlite python -m benchmarks.cart_lookup --carts 100000
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.common import benchmark_database, report, setup_django, summarize
+
+
+def seed(Cart, carts, carts_per_user, batch_size=10000):
+    users = max(1, carts // carts_per_user)
+    batch = []
+    for n in range(carts):
+        user = n % users
+        batch.append(Cart(user_id=f"user-{user}", is_active=n < users))
+        if len(batch) >= batch_size:
+            Cart.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Cart.objects.bulk_create(batch)
+    return users
+
+
+def time_lookups(Cart, users, lookups):
+    rng = random.Random(0)
+    samples = []
+    for _ in range(lookups):
+        user_id = f"user-{rng.randrange(users)}"
+        start = time.perf_counter()
+        Cart.objects.active().get(user_id=user_id)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carts", type=int, default=1_000_000)
+    parser.add_argument("--carts-per-user", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--keepdb", action="store_true")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection, transaction
+    from inventory.models import Cart
+
+    with benchmark_database(keepdb=args.keepdb):
+        start = time.perf_counter()
+        users = seed(Cart, args.carts, args.carts_per_user)
+        seed_seconds = time.perf_counter() - start
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE inventory_cart")
+
+        def plan(queryset):
+            return queryset.filter(user_id="user-1").explain()
+
+        result = {
+            "vendor": connection.vendor,
+            "carts": args.carts,
+            "users": users,
+            "seed_seconds": round(seed_seconds, 2),
+            "indexed": {
+                "plan": plan(Cart.objects.active()),
+                "latency": summarize(time_lookups(Cart, users, args.lookups)),
+            },
+        }
+
+        # A conditional UniqueConstraint is a plain partial unique index on
+        # both Postgres and SQLite, and both roll back DDL with the transaction.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "DROP INDEX %s" % connection.ops.quote_name("unique_active_cart_per_user")
+                )
+            result["unindexed"] = {
+                # The no-op exclude changes the SQL text so SQLite's statement
+                # cache cannot hand back the plan prepared before the DROP.
+                "plan": plan(Cart.objects.active().exclude(pk=None)),
+                "latency": summarize(time_lookups(Cart, users, args.lookups)),
+            }
+            transaction.set_rollback(True)
+
+    report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Checkout throughput on one hot item, single stock row vs sharded stock.
+
+Seeds one item with ``--stock`` units, then ``--concurrency`` threads each
+run checkout-shaped transactions (take ``--quantity`` units with
+``Item.objects.decrement_stock`` and write a PurchaseLog row, so the stock
+lock is held across a second round trip) for ``--seconds``. ``--hold-ms``
+keeps each transaction open that much longer, standing in for the network
+round trips to a remote database that a local one does not have. Runs once with
+the stock in the item row and once per ``--shards`` count with
+STOCK_SHARDING on, rebalancing between runs.
+
+    python -m benchmarks.contention --concurrency 32 --shards 4 16
+    python -m benchmarks.contention --concurrency 32 --hold-ms 5
+    BENCH_DATABASE=sqlite python -m benchmarks.contention --concurrency 1
+
+SQLite serializes all writers, so only Postgres shows the difference.
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks.common import benchmark_database, report, setup_django, summarize
+
+
+def run(item, concurrency, seconds, quantity, hold):
+    from django.db import connection, transaction
+    from inventory.models import Item, PurchaseLog
+
+    samples, failures = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        mine, failed = [], 0
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                with transaction.atomic():
+                    if Item.objects.decrement_stock({item.id: quantity}):
+                        failed += 1
+                        continue
+                    PurchaseLog.objects.create(
+                        user_id="bench",
+                        item=item,
+                        quantity=quantity,
+                        purchase_price=item.price,
+                    )
+                    if hold:
+                        time.sleep(hold)
+                mine.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+        with lock:
+            samples.extend(mine)
+            failures.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return {
+        "checkouts": len(samples),
+        "out_of_stock": sum(failures),
+        "throughput_per_s": round(len(samples) / wall, 1),
+        "latency": summarize(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--stock", type=int, default=10_000_000)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--shards", type=int, nargs="+", default=[16])
+    parser.add_argument("--hold-ms", type=float, default=0)
+    parser.add_argument("--keepdb", action="store_true")
+    args = parser.parse_args()
+
+    setup_django()
+    from decimal import Decimal
+
+    from django.db import connection
+    from django.test.utils import override_settings
+    from inventory.models import Item
+    from inventory.sharding import rebalance
+
+    with benchmark_database(keepdb=args.keepdb):
+        item = Item.objects.create(
+            name="Flash sale item", price=Decimal("9.99"), quantity=args.stock
+        )
+        run_args = (item, args.concurrency, args.seconds, args.quantity, args.hold_ms / 1000)
+        result = {
+            "vendor": connection.vendor,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "hold_ms": args.hold_ms,
+            "single_row": run(*run_args),
+        }
+        with override_settings(STOCK_SHARDING=True):
+            for shards in args.shards:
+                rebalance(item.id, shards)
+                result[f"shards_{shards}"] = run(*run_args)
+        connection.close()
+    report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Latency of a running server under concurrent keep-alive clients.
+
+Sends ``--requests`` GETs to each ``--path`` from ``--concurrency`` threads
+and reports p50/p95/p99. Start the server with the configuration under test
+(for example ``DB_CONN_MAX_AGE=0``, the default persistent connections, or
+``DB_POOL=true``) and run once per configuration:
+
+    python -m benchmarks.http_latency --base-url http://localhost:8000 \\
+        --path /api/cart/benchmark-user/ --requests 5000 --concurrency 8
+
+Several ``--concurrency`` values produce one run each, which shows how a
+path scales, e.g. the sync and async cart views under ASGI:
+
+    python -m benchmarks.http_latency --path /api/async/cart/benchmark-user/ \\
+        --concurrency 1 8 32 64
+"""
+
+import argparse
+import http.client
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from benchmarks.common import report, summarize
+
+
+class KeepAliveClient:
+    """One persistent HTTP connection per thread, reopened on failure."""
+
+    local = threading.local()
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+
+    def request(self, method, path, body=None, headers=None):
+        conn = getattr(self.local, "conn", None)
+        reused = conn is not None
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(
+                self.host, self.port, timeout=30
+            )
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.getheaders(), response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            if reused:
+                # The server closed an idle keep-alive connection; retry once.
+                return self.request(method, path, body, headers)
+            raise
+
+
+def run(client, paths, requests, concurrency):
+    samples, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def one(n):
+        path = paths[n % len(paths)]
+        start = time.perf_counter()
+        try:
+            status, _, _ = client.request("GET", path)
+        except (http.client.HTTPException, OSError):
+            status = "error"
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.append(elapsed)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / wall, 1),
+        "statuses": dict(statuses),
+        "latency": summarize(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", dest="paths")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8])
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--label", default="", help="Free-form tag copied into the output")
+    args = parser.parse_args()
+
+    paths = args.paths or ["/api/cart/benchmark-user/"]
+    client = KeepAliveClient(args.base_url)
+    runs = []
+    for concurrency in args.concurrency:
+        run(client, paths, args.warmup, concurrency)
+        runs.append(run(client, paths, args.requests, concurrency))
+    result = {"label": args.label, "base_url": args.base_url, "paths": paths}
+    if len(runs) == 1:
+        result.update(runs[0])
+    else:
+        result["runs"] = runs
+    report(result)
+
+
+if __name__ == "__main__":
+    main()
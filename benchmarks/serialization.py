@@ -0,0 +1,94 @@
+"""Serialization and rendering time for a large item listing.
+
+Seeds ``--items`` items into a throwaway database and times, per variant,
+fetching them, turning them into primitives and rendering JSON:
+
+* ``drf``: model instances, ``ItemSerializer`` and DRF's ``JSONRenderer``
+* ``serializer_orjson``: the same serializer with ``FastJSONRenderer``
+* ``values_orjson``: ``values()`` rows, ``item_rows_data`` and
+  ``FastJSONRenderer`` (what ``GET /api/items/`` uses)
+
+    python -m benchmarks.serialization --items 10000
+    BENCH_DATABASE=sqlite python -m benchmarks.serialization
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks.common import benchmark_database, report, setup_django
+
+
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, round(statistics.median(samples) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    setup_django()
+    from decimal import Decimal
+
+    from rest_framework.renderers import JSONRenderer
+
+    from inventory import renderers
+    from inventory.models import Item
+    from inventory.renderers import FastJSONRenderer
+    from inventory.serializers import ITEM_FIELDS, ItemSerializer, item_rows_data
+
+    with benchmark_database():
+        Item.objects.bulk_create(
+            [
+                Item(name=f"Item {n}", price=Decimal(n % 9000 + 100) / 100, quantity=n)
+                for n in range(args.items)
+            ],
+            batch_size=5000,
+        )
+        queryset = Item.objects.order_by("id")
+        variants = {
+            "drf": (lambda: list(queryset.all()), ItemSerializer, JSONRenderer()),
+            "serializer_orjson": (
+                lambda: list(queryset.all()),
+                ItemSerializer,
+                FastJSONRenderer(),
+            ),
+            "values_orjson": (
+                lambda: list(queryset.values(*ITEM_FIELDS)),
+                None,
+                FastJSONRenderer(),
+            ),
+        }
+
+        result = {"items": args.items, "orjson": renderers.orjson is not None}
+        outputs = set()
+        for name, (fetch, serializer, renderer) in variants.items():
+            rows, fetch_ms = timed(fetch, args.repeat)
+            if serializer is None:
+                data, serialize_ms = timed(lambda: item_rows_data(rows), args.repeat)
+            else:
+                data, serialize_ms = timed(
+                    lambda: serializer(rows, many=True).data, args.repeat
+                )
+            body, render_ms = timed(lambda: renderer.render(data), args.repeat)
+            outputs.add(body)
+            result[name] = {
+                "fetch_ms": fetch_ms,
+                "serialize_ms": serialize_ms,
+                "render_ms": render_ms,
+                "total_ms": round(fetch_ms + serialize_ms + render_ms, 2),
+                "bytes": len(body),
+            }
+        result["identical_output"] = len(outputs) == 1
+    report(result)
+
+
+if __name__ == "__main__":
+    main()
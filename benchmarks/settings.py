@@ -0,0 +1,20 @@
+"""Settings for running benchmarks.
+
+Uses the project settings unchanged, except that ``BENCH_DATABASE=sqlite``
+swaps the database for a local SQLite file so the suite can run without
+Postgres.
+"""
+
+import os
+
+from ecommerce_api.settings import *  # noqa: F401,F403
+from ecommerce_api.settings import BASE_DIR
+
+if os.getenv("BENCH_DATABASE") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "bench.sqlite3",
+            "TEST": {"NAME": BASE_DIR / "bench_test.sqlite3"},
+        }
+    }
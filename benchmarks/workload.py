@@ -0,0 +1,332 @@
+"""Mixed workload over every endpoint, in-process or against a running server.
+
+Seeds ``--items`` items and ``--carts`` active carts, then sends ``--requests``
+requests from ``--concurrency`` threads, picking each operation from
+``--mix`` (weights per operation):
+
+    items    GET  /api/items/
+    add      POST /api/add-to-cart/
+    cart     GET  /api/cart/<user_id>/
+    purchase POST /api/purchase/
+    confirm  POST /api/confirm-purchase/
+
+Reports throughput, latency percentiles and SQL queries per request (read from
+the ``Server-Timing`` header, so REQUEST_METRICS_ENABLED must be on) overall
+and per operation. By default the requests go through Django's test client
+inside a throwaway database; ``--base-url`` sends them over HTTP instead.
+
+    python -m benchmarks.workload --items 10000 --carts 1000 --requests 5000
+    BENCH_DATABASE=sqlite python -m benchmarks.workload --concurrency 1
+    python -m benchmarks.workload --mix items=70,cart=20,add=10 --record trace.jsonl
+    python -m benchmarks.workload --trace trace.jsonl --concurrency 16
+
+A trace is a JSONL file with one request per line, either an operation
+(``{"op": "add", "user_id": "bench-user-3", "item_id": 17, "quantity": 1}``;
+missing fields are filled in randomly) or a raw request
+(``{"method": "GET", "path": "/api/items/?limit=50"}``). ``--record`` writes
+the generated workload in that format so a run can be replayed exactly.
+
+Over HTTP the server must use the database that ``--seed-data`` writes to;
+without ``--seed-data`` the item ids are discovered from ``/api/items/``.
+"""
+
+import argparse
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.common import benchmark_database, report, setup_django, summarize
+
+OPERATIONS = ("items", "add", "cart", "purchase", "confirm")
+DEFAULT_MIX = "items=40,add=30,cart=20,purchase=5,confirm=5"
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r}")
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def seed(items, carts, lines_per_cart, stock, rng):
+    """Create the catalogue and one active cart per benchmark user."""
+    from decimal import Decimal
+
+    from inventory.models import Cart, CartItem, Item
+
+    created = Item.objects.bulk_create(
+        [
+            Item(
+                name=f"Bench item {n}",
+                price=Decimal(rng.randrange(100, 100000)) / 100,
+                quantity=stock,
+            )
+            for n in range(items)
+        ],
+        batch_size=5000,
+    )
+    item_ids = [item.pk for item in created]
+    cart_objs = Cart.objects.bulk_create(
+        [Cart(user_id=f"bench-user-{n}") for n in range(carts)], batch_size=5000
+    )
+    prices = {item.pk: item.price for item in created}
+    CartItem.objects.bulk_create(
+        [
+            CartItem(
+                cart=cart,
+                item_id=item_id,
+                quantity=rng.randint(1, 3),
+                price_at_addition=prices[item_id],
+            )
+            for cart in cart_objs
+            for item_id in rng.sample(item_ids, min(lines_per_cart, len(item_ids)))
+        ],
+        batch_size=5000,
+    )
+    return item_ids
+
+
+def build_request(op, rng, item_ids, users, **fields):
+    user_id = fields.get("user_id") or f"bench-user-{rng.randrange(users)}"
+    if op == "items":
+        cursor = fields.get("cursor", 0 if rng.random() < 0.5 else rng.choice(item_ids))
+        return "GET", f"/api/items/?cursor={cursor}", None
+    if op == "cart":
+        return "GET", f"/api/cart/{user_id}/", None
+    if op == "add":
+        body = {
+            "user_id": user_id,
+            "item_id": fields.get("item_id") or rng.choice(item_ids),
+            "quantity": fields.get("quantity", 1),
+        }
+        return "POST", "/api/add-to-cart/", body
+    if op == "purchase":
+        return "POST", "/api/purchase/", {"user_id": user_id}
+    if op == "confirm":
+        return "POST", "/api/confirm-purchase/", {"user_id": user_id}
+    raise ValueError(f"unknown operation {op!r}")
+
+
+def generate(mix, requests, rng, item_ids, users):
+    ops, weights = zip(*mix.items())
+    for op in rng.choices(ops, weights, k=requests):
+        method, path, body = build_request(op, rng, item_ids, users)
+        yield {"op": op, "method": method, "path": path, "body": body}
+
+
+def load_trace(path, rng, item_ids, users):
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "path" in entry:
+                yield {
+                    "op": entry.get("op", entry["path"]),
+                    "method": entry.get("method", "GET"),
+                    "path": entry["path"],
+                    "body": entry.get("body"),
+                }
+            else:
+                op = entry.pop("op")
+                method, path, body = build_request(op, rng, item_ids, users, **entry)
+                yield {"op": op, "method": method, "path": path, "body": body}
+
+
+class InProcessClient:
+    """Django's test client, one per thread, each with its own DB connection."""
+
+    local = threading.local()
+
+    def request(self, method, path, body=None):
+        from django.test import Client
+
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = Client()
+        response = client.generic(
+            method,
+            path,
+            data=json.dumps(body) if body is not None else "",
+            content_type="application/json",
+        )
+        return response.status_code, response.headers.get("Server-Timing", "")
+
+    def close(self):
+        from django.db import connections
+
+        connections.close_all()
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        from benchmarks.http_latency import KeepAliveClient
+
+        self.client = KeepAliveClient(base_url)
+
+    def request(self, method, path, body=None):
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        status, response_headers, _ = self.client.request(method, path, body, headers)
+        timing = dict((k.lower(), v) for k, v in response_headers).get("server-timing", "")
+        return status, timing
+
+    def close(self):
+        pass
+
+
+def run(client, workload, concurrency):
+    samples = defaultdict(list)
+    queries = defaultdict(list)
+    statuses = defaultdict(Counter)
+    lock = threading.Lock()
+    pending = iter(workload)
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    status, timing = client.request(
+                        request["method"], request["path"], request["body"]
+                    )
+                except Exception as e:  # a failed request is a result, not a crash
+                    status, timing = type(e).__name__, ""
+                elapsed = time.perf_counter() - start
+                match = QUERIES.search(timing)
+                with lock:
+                    samples[request["op"]].append(elapsed)
+                    statuses[request["op"]][status] += 1
+                    if match:
+                        queries[request["op"]].append(int(match.group(1)))
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    def query_stats(counts):
+        if not counts:
+            return None
+        return {"mean": round(sum(counts) / len(counts), 2), "max": max(counts)}
+
+    total = sum(len(s) for s in samples.values())
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(total / wall, 1) if wall else None,
+        "latency": summarize([s for op in samples.values() for s in op]),
+        "queries_per_request": query_stats([q for op in queries.values() for q in op]),
+        "operations": {
+            op: {
+                "statuses": dict(statuses[op]),
+                "latency": summarize(samples[op]),
+                "queries_per_request": query_stats(queries[op]),
+            }
+            for op in sorted(samples)
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--carts", type=int, default=200)
+    parser.add_argument("--lines-per-cart", type=int, default=3)
+    parser.add_argument("--stock", type=int, default=1_000_000)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--trace", help="Replay requests from a JSONL trace")
+    parser.add_argument("--record", help="Write the generated requests to a JSONL trace")
+    parser.add_argument("--base-url", help="Send requests over HTTP to a running server")
+    parser.add_argument(
+        "--seed-data",
+        action="store_true",
+        help="With --base-url, seed the configured database the server uses",
+    )
+    parser.add_argument("--keepdb", action="store_true")
+    parser.add_argument("--label", default="", help="Free-form tag copied into the output")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    result = {
+        "label": args.label,
+        "commit": git_revision(),
+        "mode": "http" if args.base_url else "in-process",
+        "mix": None if args.trace else args.mix,
+        "trace": args.trace,
+        "items": args.items,
+        "carts": args.carts,
+    }
+
+    def execute(client, item_ids):
+        if args.trace:
+            workload = list(load_trace(args.trace, rng, item_ids, args.carts))
+        else:
+            workload = list(generate(args.mix, args.requests, rng, item_ids, args.carts))
+        if args.record:
+            with open(args.record, "w") as f:
+                for request in workload:
+                    f.write(json.dumps(request) + "\n")
+        result.update(run(client, workload, args.concurrency))
+
+    if args.base_url:
+        result["base_url"] = args.base_url
+        if args.seed_data:
+            setup_django()
+            item_ids = seed(args.items, args.carts, args.lines_per_cart, args.stock, rng)
+        else:
+            client = HTTPClient(args.base_url)
+            _, _, body = client.client.request("GET", "/api/items/?limit=1000")
+            item_ids = [item["id"] for item in json.loads(body)["data"]]
+        execute(HTTPClient(args.base_url), item_ids)
+    else:
+        setup_django()
+        from django.db import connection
+        from django.test.utils import setup_test_environment
+
+        setup_test_environment(debug=False)
+        with benchmark_database(keepdb=args.keepdb):
+            result["vendor"] = connection.vendor
+            item_ids = seed(args.items, args.carts, args.lines_per_cart, args.stock, rng)
+            connection.close()
+            execute(InProcessClient(), item_ids)
+    report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,9 +25,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = "django-insecure-gb)*qmg7nfn@ex!&ljvs97sg(tf$!vw@&c2^++cjcd@g#o4bu+"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv("DJANGO_DEBUG", "true").lower() == "true"
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",")
+    if host.strip()
+]
 
 
 # Application definition
@@ -44,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "inventory.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -71,6 +76,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "ecommerce_api.wsgi.application"
+ASGI_APPLICATION = "ecommerce_api.asgi.application"
+
+# "wsgi" or "asgi"; selects the gunicorn worker type (see gunicorn.conf.py).
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
 
 
 # Database
@@ -91,9 +100,161 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": os.getenv("POSTGRES_HOST"),
         "PORT": os.getenv("POSTGRES_PORT"),
+        # Reuse connections across requests instead of paying the connect and
+        # auth handshake every time; health checks discard dead connections.
+        # Persistent connections leak under ASGI, which pools instead (below).
+        "CONN_MAX_AGE": int(
+            os.getenv("DB_CONN_MAX_AGE", "0" if SERVER_MODE == "asgi" else "60")
+        ),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "true").lower()
+        == "true",
+    }
+}
+
+# psycopg 3 connection pool shared by all threads of a worker; optional under
+# WSGI and the default under ASGI.
+# Django does not allow persistent connections together with a pool.
+if os.getenv("DB_POOL", "true" if SERVER_MODE == "asgi" else "false").lower() == "true":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        }
+    }
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Point CACHE_BACKEND at Redis or a file cache to share entries across workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
     }
 }
+# LocMem and file caches hold 300 entries by default; cart snapshots need
+# about two per active cart plus one per item in a cart.
+if os.getenv("CACHE_MAX_ENTRIES"):
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES"))}
+
+# GET /api/items/ is keyset-paginated. With CATALOGUE_CACHE_ENABLED its pages
+# are cached in CATALOGUE_CACHE_ALIAS per catalogue version, which changes
+# whenever an Item row changes. The version is bumped in the cache the change
+# was made through, so with several workers the alias must be shared (Redis or
+# file based), not LocMem.
+ITEM_LIST_PAGE_SIZE = int(os.getenv("ITEM_LIST_PAGE_SIZE", "100"))
+ITEM_LIST_MAX_PAGE_SIZE = int(os.getenv("ITEM_LIST_MAX_PAGE_SIZE", "1000"))
+CATALOGUE_CACHE_ENABLED = (
+    os.getenv("CATALOGUE_CACHE_ENABLED", "false").lower() == "true"
+)
+CATALOGUE_CACHE_ALIAS = os.getenv("CATALOGUE_CACHE_ALIAS", "default")
+CATALOGUE_CACHE_TIMEOUT = int(os.getenv("CATALOGUE_CACHE_TIMEOUT", "300"))
+
+# With CART_CACHE_ENABLED, GET /api/cart/<user_id>/ serves snapshots from the
+# CART_CACHE_ALIAS cache until the cart or one of its items changes. Snapshots
+# are invalidated in the cache the change was made through, so with several
+# workers the alias must be shared (Redis or file based), not LocMem.
+CART_CACHE_ENABLED = os.getenv("CART_CACHE_ENABLED", "false").lower() == "true"
+CART_CACHE_ALIAS = os.getenv("CART_CACHE_ALIAS", "default")
+CART_CACHE_TIMEOUT = int(os.getenv("CART_CACHE_TIMEOUT", "300"))
+
+
+# Rows fetched per server-side cursor round trip by GET /api/items/export/.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+# Checkout transactions that fail with a deadlock or serialization error are
+# retried this many times, backing off exponentially from the base delay.
+CHECKOUT_RETRY_ATTEMPTS = int(os.getenv("CHECKOUT_RETRY_ATTEMPTS", "3"))
+CHECKOUT_RETRY_BACKOFF = float(os.getenv("CHECKOUT_RETRY_BACKOFF", "0.05"))
+
+# Idempotency-Key handling for purchase requests. The backend is either
+# inventory.idempotency.DatabaseBackend or inventory.idempotency.CacheBackend
+# (which uses the IDEMPOTENCY_CACHE_ALIAS cache). Stored responses are kept
+# for IDEMPOTENCY_TTL seconds; a duplicate waits up to IDEMPOTENCY_WAIT_TIMEOUT
+# seconds for the original to finish, and a claim older than
+# IDEMPOTENCY_LOCK_TIMEOUT seconds is treated as abandoned.
+IDEMPOTENCY_BACKEND = os.getenv(
+    "IDEMPOTENCY_BACKEND", "inventory.idempotency.DatabaseBackend"
+)
+IDEMPOTENCY_CACHE_ALIAS = os.getenv("IDEMPOTENCY_CACHE_ALIAS", "default")
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.1"))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60"))
+
+# With CART_RESERVATIONS, adding to a cart holds the stock for
+# CART_RESERVATION_TTL seconds after the cart was last touched; run the
+# release_expired_reservations command periodically to return expired holds.
+CART_RESERVATIONS = os.getenv("CART_RESERVATIONS", "false").lower() == "true"
+CART_RESERVATION_TTL = int(os.getenv("CART_RESERVATION_TTL", "900"))
+
+# GET /api/items/changes/ pages through the change feed; prune_item_changes
+# deletes changes older than ITEM_CHANGES_RETENTION_DAYS.
+ITEM_CHANGES_RETENTION_DAYS = int(os.getenv("ITEM_CHANGES_RETENTION_DAYS", "7"))
+ITEM_CHANGES_PAGE_SIZE = int(os.getenv("ITEM_CHANGES_PAGE_SIZE", "500"))
+ITEM_CHANGES_MAX_PAGE_SIZE = int(os.getenv("ITEM_CHANGES_MAX_PAGE_SIZE", "5000"))
+
+# With STOCK_SHARDING, items split with `rebalance_stock_shards --item ID
+# --shards N` keep their stock in N counter rows so concurrent checkouts of a
+# hot item do not queue on one row lock. Merge items back (--shards 0) before
+# turning it off again.
+STOCK_SHARDING = os.getenv("STOCK_SHARDING", "false").lower() == "true"
+
+# With CHECKOUT_QUEUE, POST /api/purchase/ queues the cart as an order and
+# answers 202 with its id; `manage.py process_orders` completes queued orders
+# in batches and GET /api/orders/<id>/ reports the outcome.
+CHECKOUT_QUEUE = os.getenv("CHECKOUT_QUEUE", "false").lower() == "true"
+
+# With OUTBOX_ENABLED, every completed purchase also writes a
+# "purchase.completed" event in the same transaction, which
+# `manage.py relay_outbox` delivers to a sink; `manage.py prune_outbox_events`
+# deletes delivered events older than OUTBOX_RETENTION_DAYS.
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+# `manage.py rollup_sales` adds PurchaseLog rows newer than its watermark to
+# the hourly and daily SalesRollup tables read by /api/sales/.
+
+# On Postgres the purchase log is partitioned by month;
+# `manage.py partition_purchase_log` creates partitions
+# PURCHASE_LOG_PARTITIONS_AHEAD months ahead and archives months older than
+# PURCHASE_LOG_RETENTION_MONTHS (0 keeps everything) to gzipped CSV files in
+# PURCHASE_LOG_ARCHIVE_DIR.
+PURCHASE_LOG_PARTITIONS_AHEAD = int(os.getenv("PURCHASE_LOG_PARTITIONS_AHEAD", "3"))
+PURCHASE_LOG_RETENTION_MONTHS = int(os.getenv("PURCHASE_LOG_RETENTION_MONTHS", "0"))
+PURCHASE_LOG_ARCHIVE_DIR = os.getenv(
+    "PURCHASE_LOG_ARCHIVE_DIR", str(BASE_DIR / "archive" / "purchaselog")
+)
+
+# Maximum number of lines accepted by one POST /api/cart-sync/ request.
+CART_SYNC_MAX_LINES = int(os.getenv("CART_SYNC_MAX_LINES", "200"))
+
+# Per-request timing and query counts: Server-Timing response headers and
+# histograms at /api/metrics/. When disabled the middleware is not loaded.
+REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "true").lower() == "true"
+
+# /api/metrics/ and /api/db-stats/ only answer clients in MONITORING_ALLOWED_IPS
+# (comma-separated addresses or networks) or sending
+# "Authorization: Bearer <MONITORING_TOKEN>" when a token is set.
+MONITORING_ALLOWED_IPS = [
+    ip.strip()
+    for ip in os.getenv("MONITORING_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if ip.strip()
+]
+MONITORING_TOKEN = os.getenv("MONITORING_TOKEN", "")
+
 
+# JSON responses are rendered with orjson when it is installed.
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "inventory.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
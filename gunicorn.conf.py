@@ -0,0 +1,42 @@
+"""Gunicorn configuration for production.
+
+    gunicorn -c gunicorn.conf.py                    # WSGI, threaded workers
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py   # ASGI, uvicorn workers
+
+The app is imported once in the master (``preload_app``) and forked, so
+workers share its memory copy-on-write and start without re-importing Django.
+"""
+
+import multiprocessing
+import os
+
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "ecommerce_api.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+elif SERVER_MODE == "wsgi":
+    wsgi_app = "ecommerce_api.wsgi:application"
+    worker_class = "gthread" if threads > 1 else "sync"
+else:
+    raise ValueError(f"SERVER_MODE must be 'wsgi' or 'asgi', not {SERVER_MODE!r}")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = timeout
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers periodically to bound slow memory growth.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+
+
+def post_fork(server, worker):
+    # Never share database connections opened in the master with workers.
+    from django.db import connections
+
+    connections.close_all()
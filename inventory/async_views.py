@@ -0,0 +1,305 @@
+"""Native async versions of the read-heavy and cart endpoints.
+
+These mirror the views in ``inventory.views`` (same URLs under ``async/``
+and the same response bodies) but use Django's async ORM, so under ASGI a
+worker keeps serving other requests while one waits on the database. DRF
+views are synchronous, so these are plain Django views returning JSON.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import status
+
+from inventory import cart_cache, catalogue, checkout, reservations
+from inventory.models import Item, Cart, CartItem
+from inventory.serializers import ITEM_FIELDS, item_rows_data
+from inventory.views import build_cart_data
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _missing_fields(data, required_fields):
+    if data is None:
+        return JsonResponse(
+            {"success": False, "error": "Request body must be a JSON object"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not all(field in data for field in required_fields):
+        return JsonResponse(
+            {
+                "success": False,
+                "error": "Missing required fields",
+                "required": required_fields,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return None
+
+
+@require_http_methods(["GET"])
+async def item_list(request):
+    try:
+        cursor = int(request.GET.get("cursor", 0))
+        limit = int(request.GET.get("limit", settings.ITEM_LIST_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse(
+            {"success": False, "error": "cursor and limit must be integers"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if cursor < 0 or limit < 1:
+        return JsonResponse(
+            {"success": False, "error": "cursor must be >= 0 and limit >= 1"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    limit = min(limit, settings.ITEM_LIST_MAX_PAGE_SIZE)
+
+    try:
+        async def build_page():
+            queryset = (
+                Item.objects.in_stock()
+                .filter(id__gt=cursor)
+                .order_by("id")
+                .values(*ITEM_FIELDS)
+            )
+            rows = [row async for row in queryset[: limit + 1]]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if settings.STOCK_SHARDING:
+                await sync_to_async(Item.objects.add_sharded_stock)(rows)
+            return {
+                "data": item_rows_data(rows),
+                "next_cursor": rows[-1]["id"] if has_more else None,
+            }
+
+        page = None if settings.CATALOGUE_CACHE_ENABLED else await build_page()
+        etag = await catalogue.aetag(cursor, limit, page)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return HttpResponseNotModified(headers={"ETag": etag})
+        if page is None:
+            page = await catalogue.aget_page(cursor, limit, build_page)
+        return JsonResponse(
+            {"success": True, "data": page["data"], "next_cursor": page["next_cursor"]},
+            status=status.HTTP_200_OK,
+            headers={"ETag": etag},
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"success": False, "error": "Failed to retrieve items", "detail": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@require_http_methods(["GET"])
+async def view_cart(request, user_id):
+    async def build(cart):
+        return build_cart_data(cart, [line async for line in checkout.cart_lines(cart)])
+
+    try:
+        data = await cart_cache.aget_cart_data(user_id, build)
+        return JsonResponse({"success": True, "data": data}, status=status.HTTP_200_OK)
+
+    except Cart.DoesNotExist:
+        return JsonResponse(
+            {"success": False, "error": "No active cart found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"success": False, "error": "Failed to retrieve cart", "detail": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def add_to_cart(request):
+    data = _json_body(request)
+    required_fields = ["user_id", "item_id"]
+    error = _missing_fields(data, required_fields)
+    if error:
+        return error
+
+    try:
+        user_id = data["user_id"]
+        item_id = data["item_id"]
+        quantity = int(data.get("quantity", 1))
+
+        if quantity <= 0:
+            return JsonResponse(
+                {"success": False, "error": "Quantity must be at least 1"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        item = await Item.objects.aget(id=item_id)
+        if settings.STOCK_SHARDING:
+            await sync_to_async(Item.objects.add_sharded_stock)([item])
+
+        if item.quantity < quantity:
+            return JsonResponse(
+                {
+                    "success": False,
+                    "error": "Insufficient stock",
+                    "available": item.quantity,
+                    "requested": quantity,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # The unique constraints on active carts and (cart, item) make these
+        # get_or_create calls safe without a surrounding transaction.
+        cart, _ = await Cart.objects.aget_or_create(
+            user_id=user_id, is_active=True, defaults={"user_id": user_id}
+        )
+
+        if settings.CART_RESERVATIONS and not await sync_to_async(reservations.hold)(
+            cart, item.id, quantity
+        ):
+            await item.arefresh_from_db(fields=["quantity"])
+            if settings.STOCK_SHARDING:
+                await sync_to_async(Item.objects.add_sharded_stock)([item])
+            return JsonResponse(
+                {
+                    "success": False,
+                    "error": "Insufficient stock",
+                    "available": item.quantity,
+                    "requested": quantity,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            cart_item, created = await CartItem.objects.aget_or_create(
+                cart=cart,
+                item=item,
+                defaults={"quantity": quantity, "price_at_addition": item.price},
+            )
+            if not created and settings.CART_RESERVATIONS:
+                # The hold above already secured the extra units.
+                cart_item.quantity += quantity
+                await CartItem.objects.filter(pk=cart_item.pk).aupdate(
+                    quantity=F("quantity") + quantity
+                )
+        except Exception:
+            if settings.CART_RESERVATIONS:
+                # The hold committed on its own; give its units back.
+                await sync_to_async(reservations.shrink)(cart, {item.id: quantity})
+            raise
+
+        if not created and not settings.CART_RESERVATIONS:
+            # One guarded UPDATE, so concurrent adds to the line cannot
+            # overwrite each other's increments.
+            added = await CartItem.objects.filter(
+                pk=cart_item.pk, quantity__lte=item.quantity - quantity
+            ).aupdate(quantity=F("quantity") + quantity)
+            await cart_item.arefresh_from_db(fields=["quantity"])
+            if not added:
+                return JsonResponse(
+                    {
+                        "success": False,
+                        "error": "Cannot add more items",
+                        "available": max(item.quantity - cart_item.quantity, 0),
+                        "requested": quantity,
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        await cart_cache.ainvalidate(user_id)
+
+        totals = await checkout.acart_summary(cart)
+
+        return JsonResponse(
+            {
+                "success": True,
+                "message": "Item added to cart",
+                "data": {
+                    "cart_id": cart.id,
+                    "item_id": item.id,
+                    "quantity": cart_item.quantity,
+                    "price_at_addition": float(cart_item.price_at_addition),
+                    "item_total": float(
+                        cart_item.price_at_addition * cart_item.quantity
+                    ),
+                    "cart_total": float(totals["subtotal"]),
+                    "cart_item_count": totals["line_count"],
+                },
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    except Item.DoesNotExist:
+        return JsonResponse(
+            {"success": False, "error": "Item not found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"success": False, "error": "Failed to add item to cart", "detail": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+def _remove_held_line(cart, item_id):
+    """Delete a cart line and release its hold in one transaction, as the
+    synchronous view does; returns the number of lines deleted."""
+    with transaction.atomic():
+        deleted, _ = CartItem.objects.filter(cart=cart, item_id=item_id).delete()
+        if deleted:
+            reservations.release(cart, [item_id])
+    return deleted
+
+
+@csrf_exempt
+@require_http_methods(["DELETE"])
+async def remove_from_cart(request):
+    data = _json_body(request)
+    error = _missing_fields(data, ["user_id", "item_id"])
+    if error:
+        return error
+
+    try:
+        cart = await Cart.objects.active().aget(user_id=data["user_id"])
+        if settings.CART_RESERVATIONS:
+            deleted = await sync_to_async(_remove_held_line)(cart, data["item_id"])
+        else:
+            deleted, _ = await CartItem.objects.filter(
+                cart=cart, item_id=data["item_id"]
+            ).adelete()
+        if not deleted:
+            return JsonResponse(
+                {"success": False, "error": "Item not found in cart"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        await cart_cache.ainvalidate(data["user_id"])
+
+        return JsonResponse(
+            {"success": True, "message": "Item removed from cart"},
+            status=status.HTTP_200_OK,
+        )
+
+    except Cart.DoesNotExist:
+        return JsonResponse(
+            {"success": False, "error": "No active cart found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    except Exception as e:
+        return JsonResponse(
+            {
+                "success": False,
+                "error": "Failed to remove item from cart",
+                "detail": str(e),
+            },
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
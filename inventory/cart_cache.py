@@ -0,0 +1,148 @@
+"""Cached ``view_cart`` snapshots (``CART_CACHE_ENABLED`` mode).
+
+A user's snapshot is stored under the user's current cart version token and
+records a version token for each item in the cart. Cart writes drop the cart
+token and item changes drop the item tokens, so a snapshot is only served
+while neither has moved. Tokens are read before the cart is loaded, so a
+change that commits while a snapshot is being built invalidates it.
+
+Only ``view_cart`` reads snapshots. Checkout loads the lines and current
+item rows from the database without locks (``checkout.load_cart_lines``)
+and relies on the guarded ``decrement_stock`` for stock, so a stale
+snapshot can only show an outdated warning; it never decides a purchase.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventory import metrics
+from inventory.models import Cart, Item
+from inventory.signals import items_changed
+
+requests = metrics.counter(
+    "cart_cache_requests_total", "view_cart snapshot lookups by result (hit/miss)."
+)
+
+
+def _cache():
+    return caches[settings.CART_CACHE_ALIAS]
+
+
+def _cart_key(user_id):
+    return f"cart:{user_id}:version"
+
+
+def _item_keys(item_ids):
+    return [f"cart-item:{item_id}:version" for item_id in item_ids]
+
+
+def _tokens(keys):
+    """Current tokens for ``keys``, creating the missing ones."""
+    tokens = _cache().get_many(keys)
+    missing = [key for key in keys if key not in tokens]
+    if missing:
+        for key in missing:
+            _cache().add(key, uuid.uuid4().hex, timeout=None)
+        tokens.update(_cache().get_many(missing))
+    return [tokens.get(key) for key in keys]
+
+
+async def _atokens(keys):
+    tokens = await _cache().aget_many(keys)
+    missing = [key for key in keys if key not in tokens]
+    if missing:
+        for key in missing:
+            await _cache().aadd(key, uuid.uuid4().hex, timeout=None)
+        tokens.update(await _cache().aget_many(missing))
+    return [tokens.get(key) for key in keys]
+
+
+def _snapshot(item_ids, tokens, data):
+    # Only cacheable if the tokens were read for exactly the items built.
+    if sorted(line["item_id"] for line in data["items"]) != item_ids:
+        return None
+    return {"item_ids": item_ids, "tokens": tokens, "data": data}
+
+
+def get_cart_data(user_id, build):
+    """Return the view_cart payload of ``user_id``'s active cart, calling
+    ``build(cart)`` on a miss. Raises ``Cart.DoesNotExist``."""
+    if not settings.CART_CACHE_ENABLED:
+        return build(Cart.objects.active().get(user_id=user_id))
+
+    key = f"cart:{user_id}:{_tokens([_cart_key(user_id)])[0]}"
+    snapshot = _cache().get(key)
+    if snapshot is not None:
+        item_ids = snapshot["item_ids"]
+        tokens = _tokens(_item_keys(item_ids))
+        if tokens == snapshot["tokens"]:
+            requests.inc(result="hit")
+            return snapshot["data"]
+    requests.inc(result="miss")
+
+    cart = Cart.objects.active().get(user_id=user_id)
+    if snapshot is None:
+        item_ids = sorted(cart.items.values_list("item_id", flat=True))
+        tokens = _tokens(_item_keys(item_ids))
+    data = build(cart)
+    snapshot = _snapshot(item_ids, tokens, data)
+    if snapshot is not None:
+        _cache().set(key, snapshot, timeout=settings.CART_CACHE_TIMEOUT)
+    return data
+
+
+async def aget_cart_data(user_id, build):
+    """Async ``get_cart_data``; ``build`` is a coroutine function."""
+    if not settings.CART_CACHE_ENABLED:
+        return await build(await Cart.objects.active().aget(user_id=user_id))
+
+    key = f"cart:{user_id}:{(await _atokens([_cart_key(user_id)]))[0]}"
+    snapshot = await _cache().aget(key)
+    if snapshot is not None:
+        item_ids = snapshot["item_ids"]
+        tokens = await _atokens(_item_keys(item_ids))
+        if tokens == snapshot["tokens"]:
+            requests.inc(result="hit")
+            return snapshot["data"]
+    requests.inc(result="miss")
+
+    cart = await Cart.objects.active().aget(user_id=user_id)
+    if snapshot is None:
+        item_ids = sorted(
+            [item_id async for item_id in cart.items.values_list("item_id", flat=True)]
+        )
+        tokens = await _atokens(_item_keys(item_ids))
+    data = await build(cart)
+    snapshot = _snapshot(item_ids, tokens, data)
+    if snapshot is not None:
+        await _cache().aset(key, snapshot, timeout=settings.CART_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate(user_id):
+    """Drop ``user_id``'s snapshot once the current transaction commits."""
+    if settings.CART_CACHE_ENABLED:
+        transaction.on_commit(lambda: _cache().delete(_cart_key(user_id)))
+
+
+async def ainvalidate(user_id):
+    """Drop ``user_id``'s snapshot now, for writes made outside a transaction."""
+    if settings.CART_CACHE_ENABLED:
+        await _cache().adelete(_cart_key(user_id))
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(items_changed)
+def invalidate_items(instance=None, item_ids=None, **kwargs):
+    if not settings.CART_CACHE_ENABLED:
+        return
+    keys = _item_keys([instance.pk] if instance is not None else item_ids)
+    # After commit, like the catalogue version, so a concurrent build cannot
+    # record the old token for the new state.
+    transaction.on_commit(lambda: _cache().delete_many(keys))
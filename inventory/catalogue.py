@@ -0,0 +1,97 @@
+"""Cached ``item_list`` pages (``CATALOGUE_CACHE_ENABLED`` mode).
+
+Pages are stored under a catalogue version token that every item change
+replaces, and the token doubles as the pages' ETag. Invalidation only
+reaches the cache the change was made through, so with several workers the
+alias must be shared. Without the cache, pages are built on every request
+and their ETag is a hash of the page itself, which every worker agrees on.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventory.models import Item
+from inventory.renderers import dumps
+from inventory.signals import items_changed
+
+VERSION_KEY = "catalogue:version"
+
+
+def _cache():
+    return caches[settings.CATALOGUE_CACHE_ALIAS]
+
+
+def get_version():
+    """Return the current catalogue version token, creating one if needed."""
+    version = _cache().get(VERSION_KEY)
+    if version is None:
+        _cache().add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = _cache().get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached catalogue page by moving to a new version."""
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def page_etag(page):
+    return f'"items-{hashlib.sha1(dumps(page)).hexdigest()}"'
+
+
+def etag(cursor, limit, page=None):
+    """ETag of the (cursor, limit) page: its version token when pages are
+    cached, otherwise a hash of the built ``page``."""
+    if page is not None:
+        return page_etag(page)
+    return f'"items-{get_version()}-{cursor}-{limit}"'
+
+
+def get_page(cursor, limit, build):
+    """Return the cached page for (cursor, limit), building it on a miss."""
+    key = f"catalogue:{get_version()}:{cursor}:{limit}"
+    page = _cache().get(key)
+    if page is None:
+        page = build()
+        _cache().set(key, page, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return page
+
+
+async def aget_version():
+    version = await _cache().aget(VERSION_KEY)
+    if version is None:
+        await _cache().aadd(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = await _cache().aget(VERSION_KEY)
+    return version
+
+
+async def aetag(cursor, limit, page=None):
+    if page is not None:
+        return page_etag(page)
+    return f'"items-{await aget_version()}-{cursor}-{limit}"'
+
+
+async def aget_page(cursor, limit, build):
+    """Async ``get_page``; ``build`` is a coroutine function."""
+    key = f"catalogue:{await aget_version()}:{cursor}:{limit}"
+    page = await _cache().aget(key)
+    if page is None:
+        page = await build()
+        await _cache().aset(key, page, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return page
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(items_changed)
+def invalidate_catalogue(**kwargs):
+    if not settings.CATALOGUE_CACHE_ENABLED:
+        return
+    # Bump after commit so a concurrent reader cannot re-cache stale rows.
+    transaction.on_commit(bump_version)
@@ -0,0 +1,110 @@
+"""Item change feed.
+
+Every change to an item's price or stock, including the bulk stock updates
+made by checkout, appends the item's new state to ``ItemChange`` with a
+single ``INSERT ... SELECT`` in the same transaction. Clients page through
+the feed with ``changes_since(token)`` to sync deltas instead of re-reading
+the catalogue.
+"""
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import DateTimeField, F, OuterRef, Value
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from inventory import txids
+from inventory.models import Item, ItemChange, sharded_stock
+from inventory.signals import items_changed
+
+CHANGE_FIELDS = ("id", "item_id", "version", "price", "quantity", "changed_at")
+
+
+def record(item_ids):
+    """Log the current state of ``item_ids`` to the change feed."""
+    if not item_ids:
+        return
+    items = Item.objects.filter(id__in=item_ids).annotate(
+        changed_at=Value(timezone.now(), output_field=DateTimeField()),
+        txid=txids.current(),
+    )
+    version, quantity = F("version"), F("quantity")
+    if settings.STOCK_SHARDING:
+        # Shard updates leave the item row alone; log the aggregate stock and
+        # version.
+        version += sharded_stock(OuterRef("pk"), "version")
+        quantity += sharded_stock(OuterRef("pk"))
+    # All annotations, because the SQL lists plain fields before annotations
+    # whatever the values_list() order.
+    items = items.annotate(
+        feed_version=version, feed_price=F("price"), feed_quantity=quantity
+    )
+    rows = items.values_list(
+        "id", "feed_version", "feed_price", "feed_quantity", "changed_at", "txid"
+    )
+    connection = connections[rows.db]
+    select, params = rows.query.get_compiler(connection=connection).as_sql()
+    qn = connection.ops.quote_name
+    columns = ", ".join(
+        qn(ItemChange._meta.get_field(name).column)
+        for name in ("item", "version", "price", "quantity", "changed_at", "txid")
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(ItemChange._meta.db_table)} ({columns}) {select}", params
+        )
+
+
+def parse_token(token):
+    """(txid, id) from a "<txid>-<id>" token; a bare id means txid 0.
+    Raises ValueError for anything else."""
+    parts = token.split("-")
+    if len(parts) > 2 or not all(part.isdigit() for part in parts):
+        raise ValueError(token)
+    if len(parts) == 1:
+        parts = ["0", *parts]
+    return int(parts[0]), int(parts[1])
+
+
+def format_token(txid, id):
+    return f"{txid}-{id}"
+
+
+def changes_since(token, limit):
+    """Return (changes, next_token, has_more) for the changes after ``token``,
+    a (txid, id) pair.
+
+    Changes are read in ``inventory.txids`` order, so one whose transaction
+    commits late is returned after the client's token rather than skipped.
+    """
+    pending = ItemChange.objects.filter(txids.after(*token))
+    finished = txids.finished()
+    if finished is not None:
+        pending = pending.filter(finished)
+    rows = list(
+        pending.order_by("txid", "id").values("txid", *CHANGE_FIELDS)[: limit + 1]
+    )
+    changes = rows[:limit]
+    if changes:
+        token = changes[-1]["txid"], changes[-1]["id"]
+    for row in changes:
+        del row["txid"]
+        row["price"] = str(row["price"])
+    return changes, format_token(*token), len(rows) > limit
+
+
+def prune(before):
+    """Delete changes made before ``before``; returns the number deleted."""
+    deleted, _ = ItemChange.objects.filter(changed_at__lt=before).delete()
+    return deleted
+
+
+@receiver(post_save, sender=Item)
+def record_saved_item(instance, **kwargs):
+    record([instance.pk])
+
+
+@receiver(items_changed)
+def record_changed_items(item_ids, **kwargs):
+    record(item_ids)
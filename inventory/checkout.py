@@ -0,0 +1,248 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import OperationalError
+from inventory import cart_cache, outbox, reservations, txids
+from inventory.models import Item, Cart, CartItem, PurchaseLog
+
+
+# SQLSTATEs Postgres uses for serialization failures and detected deadlocks.
+TRANSIENT_SQLSTATES = {"40001", "40P01"}
+
+
+class StockUnavailable(Exception):
+    def __init__(self, item_ids):
+        super().__init__("Insufficient stock for one or more items")
+        self.item_ids = item_ids
+
+
+def is_transient_error(exc):
+    """True if ``exc`` aborted the checkout but re-running it may succeed.
+
+    Covers lock conflicts reported by the database and ``StockUnavailable``,
+    raised when another checkout sold the stock between our read and write;
+    a retry re-reads the cart and reports the change to the client.
+    """
+    if isinstance(exc, StockUnavailable):
+        return True
+    if not isinstance(exc, OperationalError):
+        return False
+    cause = exc.__cause__
+    sqlstate = getattr(cause, "pgcode", None) or getattr(
+        getattr(cause, "diag", None), "sqlstate", None
+    )
+    if sqlstate:
+        return sqlstate in TRANSIENT_SQLSTATES
+    # SQLite reports lock contention as "database is locked".
+    return "locked" in str(exc)
+
+
+def _with_stock(lines):
+    if settings.CART_RESERVATIONS:
+        lines = lines.with_holds()
+    if settings.STOCK_SHARDING:
+        lines = lines.with_shards()
+    return lines
+
+
+def cart_lines(cart):
+    """The cart's lines joined with their item and annotated with ``held``
+    (the stock reserved for the line, 0 without CART_RESERVATIONS),
+    ``sharded`` (0 without STOCK_SHARDING) and the totals and change flags of
+    ``CartItemQuerySet.with_totals``."""
+    return _with_stock(cart.items.with_item()).with_totals()
+
+
+def _summary_lines(cart):
+    return _with_stock(cart.items.all())
+
+
+def cart_summary(cart):
+    """Subtotal, item and line counts of ``cart`` in one aggregate query."""
+    return _summary_lines(cart).summary()
+
+
+async def acart_summary(cart):
+    return await _summary_lines(cart).asummary()
+
+
+def load_cart_lines(cart):
+    """Return the cart's lines joined with their current item rows.
+
+    No row locks are taken: stock is only ever changed through the guarded
+    ``Item.objects.decrement_stock``, which rejects lines that raced.
+    """
+    return list(cart_lines(cart))
+
+
+def load_lines_by_cart(carts):
+    """``load_cart_lines`` for several carts in one query: {cart_id: lines}."""
+    lines = defaultdict(list)
+    queryset = CartItem.objects.filter(cart__in=carts).with_item()
+    for line in _with_stock(queryset).with_totals():
+        lines[line.cart_id].append(line)
+    return lines
+
+
+def detect_changes(lines):
+    changes = []
+    for line in lines:
+        item = line.item
+        if line.price_changed:
+            changes.append(
+                {
+                    "item_id": item.id,
+                    "name": item.name,
+                    "type": "price_change",
+                    "old_price": float(line.price_at_addition),
+                    "new_price": float(item.price),
+                    "difference": float(item.price - line.price_at_addition),
+                }
+            )
+        if line.stock_changed:
+            changes.append(
+                {
+                    "item_id": item.id,
+                    "name": item.name,
+                    "type": "stock_change",
+                    "requested": line.quantity,
+                    "available": line.available,
+                    "difference": line.available - line.quantity,
+                }
+            )
+    return changes
+
+
+def complete_purchase(cart, purchases):
+    """Sell ``purchases`` ([(cart_item, unit_price), ...]) and close ``cart``.
+
+    Runs a fixed number of statements regardless of cart size: one guarded
+    stock UPDATE, one PurchaseLog INSERT (plus one OutboxEvent INSERT with
+    OUTBOX_ENABLED) and one cart UPDATE. Raises
+    ``StockUnavailable`` if another checkout sold the stock first; callers
+    must run inside a transaction so that nothing is written in that case.
+
+    With CART_RESERVATIONS the cart's holds are converted: only the part of a
+    line that is not held is taken from stock, and holds exceeding the
+    purchased quantity are returned.
+    """
+    complete_purchases([(cart, purchases)])
+
+
+def complete_purchases(orders):
+    """``complete_purchase`` for several carts ([(cart, purchases), ...]) at
+    once, with the same statements: each item's stock is updated once for
+    all of them, so its row lock is taken once per batch."""
+    quantities = defaultdict(int)
+    for _, purchases in orders:
+        for line, _ in purchases:
+            quantities[line.item_id] += line.quantity
+    surplus = {}
+    if settings.CART_RESERVATIONS:
+        for cart, _ in orders:
+            for item_id, held in reservations.consume(cart).items():
+                quantities[item_id] -= held
+        surplus = {item_id: -n for item_id, n in quantities.items() if n < 0}
+        quantities = {item_id: n for item_id, n in quantities.items() if n > 0}
+    failed = Item.objects.decrement_stock(quantities)
+    if failed:
+        raise StockUnavailable(failed)
+    Item.objects.increment_stock(surplus)
+
+    txid = txids.current()
+    PurchaseLog.objects.bulk_create(
+        [
+            PurchaseLog(
+                txid=txid,
+                user_id=cart.user_id,
+                item_id=line.item_id,
+                quantity=line.quantity,
+                purchase_price=price,
+            )
+            for cart, purchases in orders
+            for line, price in purchases
+        ]
+    )
+    outbox.record_purchases(orders)
+    Cart.objects.filter(pk__in=[cart.pk for cart, _ in orders]).update(is_active=False)
+    for cart, _ in orders:
+        cart.is_active = False
+        cart_cache.invalidate(cart.user_id)
+
+
+def changes_body(lines, changes):
+    """Response body for a checkout stopped by ``detect_changes``."""
+    return {
+        "success": False,
+        "error": "Cart items have changed",
+        "code": "cart_changes_detected",
+        "changes": changes,
+        "requires_confirmation": True,
+        "cart_total": float(sum((line.line_total for line in lines), Decimal("0.00"))),
+    }
+
+
+def receipt_body(lines):
+    """Response body for a checkout of ``lines`` at their prices at addition."""
+    purchased_items = [
+        {
+            "item_id": line.item.id,
+            "name": line.item.name,
+            "quantity": line.quantity,
+            "price": float(line.price_at_addition),
+            "item_total": float(line.line_total),
+        }
+        for line in lines
+    ]
+    return {
+        "success": True,
+        "message": "Purchase completed successfully",
+        "purchased_items": purchased_items,
+        "purchase_total": float(
+            sum((line.line_total for line in lines), Decimal("0.00"))
+        ),
+        "item_count": len(purchased_items),
+    }
+
+
+def apply_stock_adjustments(lines):
+    """Shrink or drop lines that exceed available stock, in bulk.
+
+    Returns the lines that can still be purchased and the warnings describing
+    what was changed.
+    """
+    purchasable, adjusted, removed, warnings = [], [], [], []
+    for line in lines:
+        item = line.item
+        if line.stock_changed:
+            if line.available > 0:
+                warnings.append(
+                    {
+                        "item_id": item.id,
+                        "name": item.name,
+                        "type": "quantity_adjusted",
+                        "requested": line.quantity,
+                        "adjusted_to": line.available,
+                    }
+                )
+                line.quantity = line.available
+                adjusted.append(line)
+            else:
+                warnings.append(
+                    {
+                        "item_id": item.id,
+                        "name": item.name,
+                        "type": "item_removed",
+                        "reason": "out_of_stock",
+                    }
+                )
+                removed.append(line.pk)
+                continue
+        purchasable.append(line)
+
+    if adjusted:
+        CartItem.objects.bulk_update(adjusted, ["quantity"])
+    if removed:
+        CartItem.objects.filter(pk__in=removed).delete()
+    return purchasable, warnings
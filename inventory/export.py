@@ -0,0 +1,105 @@
+"""Streaming catalogue export as NDJSON or CSV.
+
+Rows are read with ``iterator(chunk_size=...)`` (a server-side cursor on
+Postgres) and encoded one chunk at a time, so memory stays flat however
+large the catalogue is. Under ASGI ``astream`` is used, because Django
+would otherwise buffer a synchronous stream in full.
+"""
+
+import csv
+import io
+
+from django.conf import settings
+from django.db.models import OuterRef, Q
+
+from inventory.models import Item, ItemChange, sharded_stock
+from inventory.renderers import dumps
+
+EXPORT_FIELDS = ("id", "name", "price", "quantity", "updated_at")
+
+
+def export_queryset(since_id=None, updated_since=None):
+    items = Item.objects.order_by("id")
+    if since_id is not None:
+        items = items.filter(id__gt=since_id)
+    if updated_since is not None:
+        updated = Q(updated_at__gte=updated_since)
+        if settings.STOCK_SHARDING:
+            # Shard updates leave the item row alone but are logged to the
+            # change feed (for ITEM_CHANGES_RETENTION_DAYS).
+            updated |= Q(
+                id__in=ItemChange.objects.filter(changed_at__gte=updated_since).values(
+                    "item_id"
+                )
+            )
+        items = items.filter(updated)
+    fields = EXPORT_FIELDS
+    if settings.STOCK_SHARDING:
+        items = items.annotate(sharded=sharded_stock(OuterRef("pk")))
+        fields += ("sharded",)
+    # values() rather than values_list(): the latter's iterator starts the
+    # query eagerly, which aiterator() cannot run from an async context.
+    return items.values(*fields)
+
+
+def _add_sharded(rows):
+    for row in rows:
+        row["quantity"] += row.pop("sharded", 0)
+
+
+def encode_ndjson(rows):
+    _add_sharded(rows)
+    for row in rows:
+        row["price"] = str(row["price"])
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def encode_csv(rows):
+    _add_sharded(rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        (
+            row["id"],
+            row["name"],
+            row["price"],
+            row["quantity"],
+            row["updated_at"].isoformat(),
+        )
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", encode_ndjson, b""),
+    "csv": ("text/csv", encode_csv, (",".join(EXPORT_FIELDS) + "\r\n").encode()),
+}
+
+
+def stream(queryset, encode, header=b""):
+    size = settings.EXPORT_CHUNK_SIZE
+    if header:
+        yield header
+    batch = []
+    for row in queryset.iterator(chunk_size=size):
+        batch.append(row)
+        if len(batch) >= size:
+            yield encode(batch)
+            batch = []
+    if batch:
+        yield encode(batch)
+
+
+async def astream(queryset, encode, header=b""):
+    size = settings.EXPORT_CHUNK_SIZE
+    if header:
+        yield header
+    batch = []
+    async for row in queryset.aiterator(chunk_size=size):
+        batch.append(row)
+        if len(batch) >= size:
+            yield encode(batch)
+            batch = []
+    if batch:
+        yield encode(batch)
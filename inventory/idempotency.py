@@ -0,0 +1,181 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from inventory.models import IdempotencyKey
+
+
+IN_PROGRESS = "in_progress"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+class DatabaseBackend:
+    """Stores keys in ``IdempotencyKey``; the unique index on ``key`` is the lock."""
+
+    def claim(self, key):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=key)
+            return True
+        except IntegrityError:
+            return False
+
+    def get(self, key):
+        record = (
+            IdempotencyKey.objects.filter(key=key)
+            .values("response_status", "response_body", "created_at")
+            .first()
+        )
+        if record is None:
+            return None
+        if record["response_status"] is None:
+            if record["created_at"] < timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT
+            ):
+                # The request that claimed the key died without finishing.
+                self.release(key)
+                return None
+            return IN_PROGRESS
+        if record["created_at"] < timezone.now() - timedelta(
+            seconds=settings.IDEMPOTENCY_TTL
+        ):
+            IdempotencyKey.objects.filter(key=key).delete()
+            return None
+        return record["response_status"], record["response_body"]
+
+    def run(self, key, call):
+        """Run ``call`` and store its response in the same transaction as its
+        writes, so a retry can never find the writes without the response.
+        Returns the response and whether it was stored."""
+        with transaction.atomic():
+            response = call()
+            if response.status_code >= 500 or transaction.get_rollback():
+                return response, False
+            self.complete(key, response.status_code, response.data)
+        return response, True
+
+    def complete(self, key, status_code, body):
+        IdempotencyKey.objects.filter(key=key).update(
+            response_status=status_code, response_body=body
+        )
+
+    def release(self, key):
+        IdempotencyKey.objects.filter(key=key, response_status__isnull=True).delete()
+
+
+class CacheBackend:
+    """Stores keys in the ``IDEMPOTENCY_CACHE_ALIAS`` cache.
+
+    Shared across workers when that alias points at Redis or a file cache;
+    claims use ``cache.add``, which is only atomic on backends such as Redis.
+    """
+
+    def __init__(self):
+        self.cache = caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+    def claim(self, key):
+        return self.cache.add(
+            self._key(key), IN_PROGRESS, timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT
+        )
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def run(self, key, call):
+        response = call()
+        if response.status_code >= 500:
+            return response, False
+        self.complete(key, response.status_code, response.data)
+        return response, True
+
+    def complete(self, key, status_code, body):
+        self.cache.set(
+            self._key(key), (status_code, body), timeout=settings.IDEMPOTENCY_TTL
+        )
+
+    def release(self, key):
+        self.cache.delete(self._key(key))
+
+    def _key(self, key):
+        return f"idempotency:{key}"
+
+
+@lru_cache(maxsize=None)
+def _backend_class(path):
+    return import_string(path)
+
+
+def get_backend():
+    return _backend_class(settings.IDEMPOTENCY_BACKEND)()
+
+
+def scoped_key(view_name, user_id, idempotency_key):
+    """The stored key for a request: per view and per user, so clients that
+    happen to pick the same Idempotency-Key never see each other's responses."""
+    key = f"{view_name}:{user_id}:{idempotency_key}"
+    if len(key) > MAX_KEY_LENGTH:
+        key = f"{view_name}:{hashlib.sha256(key.encode()).hexdigest()}"
+    return key
+
+
+def idempotent(view):
+    """Make ``view`` safe to retry with an ``Idempotency-Key`` header.
+
+    The first request with a key runs the view and stores its response; any
+    later request from the same user with the same key gets that response
+    replayed. A duplicate
+    that arrives while the original is still running waits for it (up to
+    ``IDEMPOTENCY_WAIT_TIMEOUT`` seconds) instead of executing again. Server
+    errors are not stored, so the client may retry them.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if not idempotency_key:
+            return view(request, *args, **kwargs)
+
+        backend = get_backend()
+        data = request.data if isinstance(request.data, dict) else {}
+        key = scoped_key(view.__name__, data.get("user_id", ""), idempotency_key)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+        while not backend.claim(key):
+            stored = backend.get(key)
+            if stored not in (None, IN_PROGRESS):
+                status_code, body = stored
+                return Response(
+                    body, status=status_code, headers={"Idempotent-Replayed": "true"}
+                )
+            if time.monotonic() >= deadline:
+                return Response(
+                    {
+                        "success": False,
+                        "error": "A request with this Idempotency-Key is in progress",
+                        "code": "duplicate_request",
+                    },
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if stored == IN_PROGRESS:
+                time.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+
+        try:
+            response, stored = backend.run(key, lambda: view(request, *args, **kwargs))
+        except Exception:
+            backend.release(key)
+            raise
+
+        if not stored:
+            backend.release(key)
+        return response
+
+    return wrapper
@@ -1,20 +1,258 @@
-from django.core.management.base import BaseCommand
-from inventory.models import Item
+import csv
+import io
 import json
+import re
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from inventory.models import Item
+from inventory.signals import items_changed
+
+READ_CHUNK_SIZE = 1 << 16
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+MAX_REPORTED_ERRORS = 10
+EXTERNAL_ID_LENGTH = Item._meta.get_field("external_id").max_length
+
+
+def iter_json_array(f):
+    """Yield the elements of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    started = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        pos = WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise CommandError("Truncated JSON array")
+            fill()
+            continue
+        char = buffer[pos]
+        if not started:
+            if char != "[":
+                raise CommandError("Expected a JSON array of items")
+            started = True
+            pos += 1
+        elif char == ",":
+            pos += 1
+        elif char == "]":
+            return
+        else:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError("Malformed JSON array")
+                fill()
+                continue
+            # A number ending the buffer may continue in the next chunk.
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            yield element
+            pos = end
+
+
+def iter_jsonl(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(f):
+    yield from csv.DictReader(f)
+
+
+READERS = {"json": iter_json_array, "jsonl": iter_jsonl, "csv": iter_csv}
+
+
+def validate_batch(rows):
+    """Split raw rows into (name, price, quantity, external_id) tuples and
+    (row, error) rejects."""
+    items, rejects = [], []
+    for row in rows:
+        try:
+            name = str(row["name"]).strip()
+            price = Decimal(str(row["price"])).quantize(Decimal("0.01"))
+            quantity = int(row["quantity"])
+        except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+            rejects.append((row, f"invalid or missing field: {e}"))
+            continue
+        external_id = row.get("id")
+        external_id = str(external_id) if external_id not in (None, "") else None
+        if not name or len(name) > 255:
+            rejects.append((row, "name must be 1-255 characters"))
+        elif price <= Decimal("0.00") or len(price.as_tuple().digits) > 10:
+            rejects.append((row, "price must be positive and fit 10 digits"))
+        elif isinstance(row["quantity"], float) and not row["quantity"].is_integer():
+            # int() would truncate it; CSV rejects "2.7" already.
+            rejects.append((row, "quantity must be a whole number"))
+        elif quantity < 0:
+            rejects.append((row, "quantity cannot be negative"))
+        elif external_id is not None and len(external_id) > EXTERNAL_ID_LENGTH:
+            rejects.append((row, f"id must be at most {EXTERNAL_ID_LENGTH} characters"))
+        else:
+            items.append((name, price, quantity, external_id))
+    return items, rejects
+
+
+def copy_rows(items, upsert):
+    """Insert ``items`` through COPY into a staging table (Postgres only).
+
+    COPY skips Django's per-field insert preparation, which dominates
+    bulk_create at this volume. Returns the ids of the inserted/updated rows.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(items)
+    buffer.seek(0)
+    table = Item._meta.db_table
+    conflict = (
+        "ON CONFLICT (external_id) DO UPDATE SET name = EXCLUDED.name, "
+        "price = EXCLUDED.price, quantity = EXCLUDED.quantity, "
+        f"updated_at = EXCLUDED.updated_at, version = {table}.version + 1"
+        if upsert
+        else ""
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE load_items_staging (name varchar(255), "
+            "price numeric(10, 2), quantity integer, external_id varchar(64))"
+        )
+        copy_sql = "COPY load_items_staging FROM STDIN WITH (FORMAT csv)"
+        if hasattr(cursor.cursor, "copy_expert"):  # psycopg2
+            cursor.cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(
+            f"INSERT INTO {table} "
+            f"(name, price, quantity, external_id, updated_at, version) "
+            f"SELECT name, price, quantity, external_id, %s, 1 FROM load_items_staging "
+            f"{conflict} RETURNING id",
+            [timezone.now()],
+        )
+        item_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DROP TABLE load_items_staging")
+        return item_ids
+
+
+def bulk_create_rows(items, upsert):
+    """Portable fallback for databases without COPY."""
+    objs = [
+        Item(name=name, price=price, quantity=quantity, external_id=external_id)
+        for name, price, quantity, external_id in items
+    ]
+    if upsert:
+        Item.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=["external_id"],
+            update_fields=["name", "price", "quantity", "updated_at"],
+        )
+        # bulk_create cannot express version + 1, so bump the whole batch
+        # (newly inserted rows start at 2, which keeps versions increasing).
+        Item.objects.filter(id__in=[obj.pk for obj in objs if obj.pk]).update(
+            version=F("version") + 1
+        )
+    else:
+        Item.objects.bulk_create(objs)
+    return [obj.pk for obj in objs if obj.pk]
 
 
 class Command(BaseCommand):
-    help = "Load initial items data from JSON file"
+    help = "Load items from a JSON, JSONL or CSV file in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="MOCK_DATA.json")
+        parser.add_argument(
+            "--format",
+            choices=["auto", *READERS],
+            default="auto",
+            help="Input format; inferred from the file extension by default",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Update existing items matched on their external id (the 'id' field)",
+        )
 
     def handle(self, *args, **options):
-        with open("MOCK_DATA.json", "r") as f:
-            items_data = json.load(f)
-
-        for item_data in items_data:
-            Item.objects.create(
-                name=item_data["name"],
-                price=item_data["price"],
-                quantity=item_data["quantity"],
+        path = Path(options["path"])
+        fmt = options["format"]
+        if fmt == "auto":
+            fmt = path.suffix.lstrip(".").lower()
+            if fmt == "ndjson":
+                fmt = "jsonl"
+            if fmt not in READERS:
+                raise CommandError(f"Cannot infer format of {path}; pass --format")
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        loaded = rejected = 0
+        start = time.perf_counter()
+        with open(path, newline="" if fmt == "csv" else None) as f:
+            batch = []
+            for row in READERS[fmt](f):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    count, errors = self.load_batch(batch, options["upsert"])
+                    loaded, rejected = loaded + count, rejected + errors
+                    batch = []
+                    self.report_progress(loaded, rejected, start)
+            if batch:
+                count, errors = self.load_batch(batch, options["upsert"])
+                loaded, rejected = loaded + count, rejected + errors
+
+        elapsed = time.perf_counter() - start
+        rate = loaded / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {loaded} items ({rejected} rejected) in {elapsed:.2f}s "
+                f"({rate:,.0f} rows/sec)"
             )
+        )
+
+    def load_batch(self, rows, upsert):
+        items, rejects = validate_batch(rows)
+        for row, error in rejects[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f"Skipping {row!r}: {error}")
+
+        if upsert:
+            # ON CONFLICT cannot touch the same row twice in one statement.
+            keyed = {item[3]: item for item in items if item[3]}
+            items = [item for item in items if not item[3]] + list(keyed.values())
+
+        with transaction.atomic():
+            try:
+                if connection.vendor == "postgresql":
+                    item_ids = copy_rows(items, upsert)
+                else:
+                    item_ids = bulk_create_rows(items, upsert)
+            except IntegrityError as e:
+                raise CommandError(
+                    f"{e}; items with these ids already exist, rerun with --upsert"
+                )
+            items_changed.send(sender=Item, item_ids=item_ids)
+        return len(items), len(rejects)
 
-        self.stdout.write(self.style.SUCCESS("Successfully loaded items data"))
+    def report_progress(self, loaded, rejected, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{loaded} loaded, {rejected} rejected, "
+            f"{loaded / elapsed if elapsed else 0:,.0f} rows/sec"
+        )
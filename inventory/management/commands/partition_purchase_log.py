@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly PurchaseLog partitions and archive months past "
+        "PURCHASE_LOG_RETENTION_MONTHS to gzipped CSV files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=settings.PURCHASE_LOG_PARTITIONS_AHEAD
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.PURCHASE_LOG_RETENTION_MONTHS,
+            help="Archive months older than this many months; 0 archives nothing",
+        )
+        parser.add_argument("--archive-dir", default=settings.PURCHASE_LOG_ARCHIVE_DIR)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if partitions.is_partitioned():
+            for name in partitions.ensure_partitions(now, options["months_ahead"]):
+                self.stdout.write(f"Created partition {name}")
+        else:
+            self.stdout.write("PurchaseLog is not partitioned on this database")
+
+        if options["retention_months"] <= 0:
+            return
+        before = partitions.month_start(now)
+        for _ in range(options["retention_months"]):
+            before = partitions.month_start(before - timedelta(days=1))
+        archived = 0
+        for month, path, count in partitions.archive(before, options["archive_dir"]):
+            if path is None:
+                self.stderr.write(
+                    f"Kept {month:%Y-%m}: not fully rolled up into sales reports "
+                    "or written to while archiving"
+                )
+                continue
+            archived += count
+            self.stdout.write(f"Archived {month:%Y-%m} to {path} ({count} rows)")
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} purchase log rows"))
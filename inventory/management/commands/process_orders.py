@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from inventory.checkout import is_transient_error
+from inventory.orders import process_batch
+
+
+class Command(BaseCommand):
+    help = "Complete checkout orders queued with CHECKOUT_QUEUE"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once the queue is empty"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            try:
+                processed = process_batch(options["batch_size"])
+            except DatabaseError as e:
+                # The batch rolled back and its orders stay queued.
+                if not is_transient_error(e):
+                    raise
+                self.stderr.write(f"Batch failed, retrying: {e}")
+                time.sleep(options["poll_interval"])
+                continue
+            total += processed
+            if processed:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} orders"))
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.changes import prune
+
+
+class Command(BaseCommand):
+    help = "Delete item change feed entries older than ITEM_CHANGES_RETENTION_DAYS"
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.ITEM_CHANGES_RETENTION_DAYS)
+        deleted = prune(cutoff)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} item changes"))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import Item
+from inventory.sharding import rebalance, rebalance_all
+
+
+class Command(BaseCommand):
+    help = "Even out sharded stock, or (re)shard one item with --item/--shards"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--item", type=int, help="Only this item")
+        parser.add_argument(
+            "--shards",
+            type=int,
+            help="With --item, the number of shards to use (0 merges them back)",
+        )
+
+    def handle(self, *args, **options):
+        if options["shards"] is not None and options["item"] is None:
+            raise CommandError("--shards requires --item")
+        if options["shards"] is not None and options["shards"] < 0:
+            raise CommandError("--shards cannot be negative")
+        if not settings.STOCK_SHARDING:
+            self.stderr.write("STOCK_SHARDING is off; shards are ignored until enabled")
+
+        if options["item"] is None:
+            count = rebalance_all()
+            self.stdout.write(self.style.SUCCESS(f"Rebalanced {count} sharded items"))
+            return
+        try:
+            target = rebalance(options["item"], options["shards"])
+        except Item.DoesNotExist:
+            raise CommandError(f"Item {options['item']} does not exist")
+        self.stdout.write(
+            self.style.SUCCESS(f"Item {options['item']} shards: {target or 'none'}")
+        )
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.outbox import get_sink, relay
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events to a sink (at-least-once, in id order)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sink",
+            default="file",
+            help="file, http, or the dotted path of a sink class",
+        )
+        parser.add_argument(
+            "--target", required=True, help="File path or URL the sink writes to"
+        )
+        parser.add_argument(
+            "--name", help="Checkpoint name; defaults to the sink name"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no events are pending"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when no events are pending or a batch failed",
+        )
+
+    def handle(self, *args, **options):
+        sink = get_sink(options["sink"], options["target"])
+        name = options["name"] or options["sink"]
+        total, start = 0, time.perf_counter()
+        try:
+            while True:
+                try:
+                    count = relay(sink, name, options["batch_size"])
+                except Exception as e:
+                    # The checkpoint did not move; the batch is retried.
+                    self.stderr.write(f"Publishing failed, retrying: {e}")
+                    if options["once"]:
+                        raise
+                    time.sleep(options["poll_interval"])
+                    continue
+                total += count
+                if count:
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"Published {count} events")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Published {total} events in {elapsed:.1f}s "
+                f"({total / elapsed if elapsed else 0:.0f} events/s)"
+            )
+        )
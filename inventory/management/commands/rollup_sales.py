@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventory.sales import roll_up
+
+
+class Command(BaseCommand):
+    help = "Add purchases made since the last run to the hourly and daily sales rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        total = 0
+        while count := roll_up(options["batch_size"]):
+            total += count
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {total} purchases"))
@@ -0,0 +1,147 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Each worker process keeps its own registry, so with several gunicorn
+workers a scrape of ``/api/metrics/`` reports the worker that served it.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self.counts = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self.sums = defaultdict(float)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[key][index] += 1
+            self.sums[key] += value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            for key, counts in sorted(self.counts.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(
+                        f"{self.name}_bucket{_labels(key + (('le', bound),))} {cumulative}"
+                    )
+                lines.append(f"{self.name}_sum{_labels(key)} {self.sums[key]}")
+                lines.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.values = defaultdict(int)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] += amount
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+REGISTRY = []
+
+
+def histogram(name, help_text, buckets):
+    metric = Histogram(name, help_text, buckets)
+    REGISTRY.append(metric)
+    return metric
+
+
+def counter(name, help_text):
+    metric = Counter(name, help_text)
+    REGISTRY.append(metric)
+    return metric
+
+
+def gauge_lines(name, help_text, samples):
+    """Render a gauge from ``samples``, a list of (labels dict, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+    return lines
+
+
+request_duration = histogram(
+    "http_request_duration_seconds", "Total time spent handling the request.", DURATION_BUCKETS
+)
+request_db_duration = histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL.", DURATION_BUCKETS
+)
+request_render_duration = histogram(
+    "http_request_render_duration_seconds",
+    "Time spent rendering (serializing) the response.",
+    DURATION_BUCKETS,
+)
+request_queries = histogram(
+    "http_request_db_queries", "SQL queries executed per request.", QUERY_BUCKETS
+)
+response_size = histogram(
+    "http_response_size_bytes", "Size of the response body.", SIZE_BUCKETS
+)
+
+
+def render():
+    """Every registered metric plus connection pool gauges, as exposition text."""
+    from inventory.monitoring import connection_stats
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    pools = {
+        alias: stats["pool"]
+        for alias, stats in connection_stats().items()
+        if stats["pool"]
+    }
+    for stat in ("pool_size", "pool_available", "requests_waiting"):
+        lines.extend(
+            gauge_lines(
+                f"db_{stat}",
+                f"psycopg_pool {stat} per database alias.",
+                [({"alias": alias}, pool.get(stat, 0)) for alias, pool in pools.items()],
+            )
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,119 @@
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from inventory import metrics
+
+# The collector for the request being handled. Context variables are copied
+# into sync_to_async threads, so queries run by async views are counted too.
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    __slots__ = ("start", "view_end", "queries", "db_time")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view_end = None
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    collector = _current.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        collector.db_time += time.perf_counter() - start
+        collector.queries += 1
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    wrappers = connection.execute_wrappers
+    if record_query not in wrappers:
+        wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """Time each request and count its SQL queries.
+
+    Adds a ``Server-Timing`` header (db, app, render and total durations) and
+    feeds the per-view histograms served by ``/api/metrics/``. Removed from
+    the middleware chain entirely when ``REQUEST_METRICS_ENABLED`` is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection=connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        collector = RequestMetrics()
+        token = _current.set(collector)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, collector)
+
+    async def __acall__(self, request):
+        collector = RequestMetrics()
+        token = _current.set(collector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, collector)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook; everything before it
+        # is view time, everything after is serialization.
+        collector = _current.get()
+        if collector is not None:
+            collector.view_end = time.perf_counter()
+        return response
+
+    def finish(self, request, response, collector):
+        end = time.perf_counter()
+        total = end - collector.start
+        view_end = collector.view_end or end
+        app = view_end - collector.start
+        render = end - view_end
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={collector.db_time * 1000:.2f};desc="{collector.queries} queries"',
+                f"app;dur={app * 1000:.2f}",
+                f"render;dur={render * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        metrics.request_duration.observe(total, view=view)
+        metrics.request_db_duration.observe(collector.db_time, view=view)
+        metrics.request_render_duration.observe(render, view=view)
+        metrics.request_queries.observe(collector.queries, view=view)
+        if not response.streaming:
+            metrics.response_size.observe(len(response.content), view=view)
+        return response
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:20
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """Make existing rows satisfy the new unique constraints.
+
+    Keeps the newest active cart per user (older ones are deactivated) and
+    folds duplicate (cart, item) lines into the oldest line.
+    """
+    Cart = apps.get_model("inventory", "Cart")
+    CartItem = apps.get_model("inventory", "CartItem")
+
+    duplicate_carts = (
+        Cart.objects.filter(is_active=True)
+        .values("user_id")
+        .annotate(count=Count("id"), keep=Max("id"))
+        .filter(count__gt=1)
+    )
+    for row in duplicate_carts:
+        Cart.objects.filter(user_id=row["user_id"], is_active=True).exclude(
+            id=row["keep"]
+        ).update(is_active=False)
+
+    duplicate_lines = (
+        CartItem.objects.values("cart_id", "item_id")
+        .annotate(count=Count("id"), keep=Min("id"), total=Sum("quantity"))
+        .filter(count__gt=1)
+    )
+    for row in duplicate_lines:
+        CartItem.objects.filter(id=row["keep"]).update(quantity=row["total"])
+        CartItem.objects.filter(cart_id=row["cart_id"], item_id=row["item_id"]).exclude(
+            id=row["keep"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['quantity'], name='item_quantity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaselog',
+            index=models.Index(fields=['user_id', 'purchased_at'], name='purchaselog_user_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('user_id',), name='unique_active_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'item'), name='unique_cart_item'),
+        ),
+    ]
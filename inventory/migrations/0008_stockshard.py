@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:25
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_item_version_itemchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)])),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='inventory.item')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('item', 'shard'), name='unique_stock_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:46
+
+import re
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+TABLE = "inventory_purchaselog"
+# Monthly partitions created past the current month; `manage.py
+# partition_purchase_log` keeps extending them.
+MONTHS_AHEAD = 3
+
+
+def _month(when):
+    return when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month):
+    return _month(month + timedelta(days=32))
+
+
+def _rebuild(schema_editor, partitioned):
+    """Copy the log into a new table, partitioned by purchased_at month or
+    not, keeping its column defaults, indexes and foreign keys.
+
+    Postgres only: other databases keep the plain table, which is what the
+    model describes.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    old = f"{TABLE}_old"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'f')",
+            [old],
+        )
+        constraints = cursor.fetchall()
+        primary_key = next(name for name, kind, _ in constraints if kind == "p")
+        foreign_keys = [(name, sql) for name, kind, sql in constraints if kind == "f"]
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s",
+            [old, primary_key],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(f"SELECT min(purchased_at), max(id) FROM {old}")
+        oldest, max_id = cursor.fetchone()
+
+        create = f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS)"
+        if partitioned:
+            create += " PARTITION BY RANGE (purchased_at)"
+        cursor.execute(create)
+        if partitioned:
+            now = timezone.now()
+            month, last = _month(min(oldest or now, now)), _month(now)
+            for _ in range(MONTHS_AHEAD):
+                last = _next_month(last)
+            while month <= last:
+                cursor.execute(
+                    f"CREATE TABLE {TABLE}_{month:%Y%m} PARTITION OF {TABLE} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') "
+                    f"TO ('{_next_month(month).isoformat()}')"
+                )
+                month = _next_month(month)
+            # Catches rows outside every monthly partition so checkout never
+            # fails for want of one.
+            cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old}")
+        cursor.execute(f"DROP TABLE {old}")
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY "
+            f"(START WITH {(max_id or 0) + 1})"
+        )
+        # A partitioned table's unique keys must include the partition key.
+        key = "id, purchased_at" if partitioned else "id"
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {primary_key} PRIMARY KEY ({key})"
+        )
+        for _, sql in indexes:
+            cursor.execute(
+                re.sub(rf" ON (ONLY )?(\S+\.)?{old} ", f" ON {TABLE} ", sql, count=1)
+            )
+        for name, sql in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {sql}")
+
+
+def partition(apps, schema_editor):
+    _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='scan_from',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='purchaselog',
+            index=models.Index(fields=['purchased_at'], name='purchaselog_time_idx'),
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_outbox_txid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaselog',
+            name='txid',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='txid',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='purchaselog',
+            index=models.Index(fields=['txid', 'id'], name='purchaselog_txid_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-17 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_purchaselog_txid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemchange',
+            name='txid',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='itemchange',
+            index=models.Index(fields=['txid', 'id'], name='itemchange_txid_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_itemchange_txid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockshard',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,8 +1,147 @@
-from django.db import models
+import random
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    DecimalField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from decimal import Decimal
 
+from inventory import txids
+from inventory.signals import items_changed
+
+
+# Output type of money arithmetic: wide enough for a quantity times a price.
+MONEY = DecimalField(max_digits=20, decimal_places=2)
+
+
+def _per_item(quantities):
+    """``CASE id WHEN ... THEN n`` selecting each item's amount in an UPDATE."""
+    return Case(
+        *[When(id=item_id, then=Value(n)) for item_id, n in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _id(item):
+    return item["id"] if isinstance(item, dict) else item.id
+
+
+def sharded_stock(item, field="quantity"):
+    """The stock held in ``item``'s shard rows (0 if unsharded), as a
+    subquery; ``item`` is an OuterRef to the item id. With
+    ``field="version"``, the version counts of the shard rows instead."""
+    total = (
+        StockShard.objects.filter(item=item)
+        .values("item")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    return Coalesce(Subquery(total), 0)
+
+
+class ItemQuerySet(models.QuerySet):
+    def in_stock(self):
+        """Items with stock left, counting sharded stock (STOCK_SHARDING)."""
+        if not settings.STOCK_SHARDING:
+            return self.filter(quantity__gt=0)
+        return self.filter(
+            Q(quantity__gt=0)
+            | Exists(StockShard.objects.filter(item=OuterRef("pk"), quantity__gt=0))
+        )
+
+    def add_sharded_stock(self, items):
+        """Add sharded stock to the ``quantity`` of ``items`` (Item instances
+        or ``values()`` rows) in place. Instances updated this way must not be
+        saved."""
+        totals = StockShard.objects.totals([_id(item) for item in items])
+        for item in items:
+            if isinstance(item, dict):
+                item["quantity"] += totals.get(item["id"], 0)
+            else:
+                item.quantity += totals.get(item.id, 0)
+        return items
+
+    def _locked_in_id_order(self, ids):
+        """Subquery locking ``ids`` in id order. Every stock UPDATE selects its
+        rows through it, so concurrent ones take their row locks in the same
+        order and cannot deadlock."""
+        return self.filter(id__in=ids).order_by("id").select_for_update().values("id")
+
+    def decrement_stock(self, quantities):
+        """Atomically subtract ``quantities`` ({item_id: n}) from stock.
+
+        Runs a single guarded ``UPDATE ... SET quantity = quantity - n WHERE
+        id = ? AND quantity >= n`` covering every item, so no row lock is held
+        across Python code. Sharded items (STOCK_SHARDING) are taken from
+        their shard rows instead. Returns the ids that did not have enough
+        stock; if any line fails, no stock is changed at all.
+        """
+        if not quantities:
+            return []
+        sharded = StockShard.objects.counts(quantities)
+        plain = {i: n for i, n in quantities.items() if i not in sharded}
+        with transaction.atomic():
+            updated = 0
+            if plain:
+                requested = _per_item(plain)
+                updated = self.filter(
+                    id__in=self._locked_in_id_order(plain), quantity__gte=requested
+                ).update(
+                    quantity=F("quantity") - requested,
+                    version=F("version") + 1,
+                    updated_at=timezone.now(),
+                )
+            if updated == len(plain) and all(
+                StockShard.objects.take(item_id, quantities[item_id], sharded[item_id])
+                for item_id in sorted(sharded)
+            ):
+                items_changed.send(sender=self.model, item_ids=list(quantities))
+                return []
+            transaction.set_rollback(True)
+
+        available = dict(self.filter(id__in=quantities).values_list("id", "quantity"))
+        for item_id, n in StockShard.objects.totals(sharded).items():
+            available[item_id] += n
+        return sorted(
+            item_id for item_id, n in quantities.items() if available.get(item_id, 0) < n
+        )
+
+    def increment_stock(self, quantities):
+        """Return ``quantities`` ({item_id: n}) to stock in a single UPDATE
+        (plus one per sharded item)."""
+        if not quantities:
+            return
+        sharded = StockShard.objects.counts(quantities)
+        plain = {i: n for i, n in quantities.items() if i not in sharded}
+        if plain:
+            with transaction.atomic():
+                self.filter(id__in=self._locked_in_id_order(plain)).update(
+                    quantity=F("quantity") + _per_item(plain),
+                    version=F("version") + 1,
+                    updated_at=timezone.now(),
+                )
+        for item_id, shards in sharded.items():
+            StockShard.objects.give(item_id, quantities[item_id], shards)
+        items_changed.send(sender=self.model, item_ids=list(quantities))
+
 
 class Item(models.Model):
     name = models.CharField(max_length=255)
@@ -10,6 +149,23 @@ class Item(models.Model):
         max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))]
     )
     quantity = models.IntegerField(validators=[MinValueValidator(0)])
+    # Identifier from the upstream catalogue feed, used to upsert on reload.
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    # Set by save(); queryset updates and bulk loads must set it explicitly.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Incremented on every change, like updated_at; each change is also
+    # logged to ItemChange (see inventory.changes).
+    version = models.PositiveBigIntegerField(default=1)
+
+    objects = ItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the in-stock filter on the item listing.
+            models.Index(fields=["quantity"], name="item_quantity_idx"),
+            # Serves incremental exports (?updated_since=).
+            models.Index(fields=["updated_at"], name="item_updated_at_idx"),
+        ]
 
     def clean(self):
         if self.quantity < 0:
@@ -22,17 +178,176 @@ class Item(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        bump = not self._state.adding
+        if bump:
+            # In SQL, so a stale instance cannot move the version backwards.
+            self.version = F("version") + 1
         super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=["version"])
 
     def __str__(self):
         return self.name
 
 
+class ItemChange(models.Model):
+    """One entry of the item change feed: an item's price and stock as of a
+    change. The feed is ordered by (txid, id), which also make up its resume
+    tokens."""
+
+    # No FK constraint, so the history of deleted items is kept.
+    item = models.ForeignKey(
+        Item, related_name="changes", on_delete=models.DO_NOTHING, db_constraint=False
+    )
+    version = models.PositiveBigIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.IntegerField()
+    changed_at = models.DateTimeField(db_index=True)
+    # Inserting transaction on Postgres (see inventory.txids), 0 elsewhere.
+    txid = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["txid", "id"], name="itemchange_txid_idx")]
+
+    def __str__(self):
+        return f"Item {self.item_id} v{self.version}"
+
+
+class StockShardQuerySet(models.QuerySet):
+    """Split stock counters for hot items (STOCK_SHARDING mode).
+
+    A sharded item's stock is its ``quantity`` plus the sum of its shard
+    rows; buyers take from a random shard, so concurrent checkouts of the
+    same item mostly lock different rows instead of queueing on one.
+    Without STOCK_SHARDING every method is a no-op returning no shards.
+    """
+
+    def counts(self, item_ids):
+        """{item_id: shard count} for the sharded items among ``item_ids``."""
+        if not settings.STOCK_SHARDING or not item_ids:
+            return {}
+        return dict(
+            self.filter(item_id__in=item_ids)
+            .values("item_id")
+            .annotate(shards=Count("id"))
+            .values_list("item_id", "shards")
+        )
+
+    def totals(self, item_ids):
+        """{item_id: stock in shard rows} for the sharded items among ``item_ids``."""
+        if not settings.STOCK_SHARDING or not item_ids:
+            return {}
+        return dict(
+            self.filter(item_id__in=item_ids)
+            .values("item_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("item_id", "total")
+        )
+
+    def take(self, item_id, quantity, shards):
+        """Take ``quantity`` of ``item_id``'s stock, spread over ``shards`` rows.
+
+        Tries one shard at a time, starting from a random one, with a guarded
+        UPDATE. Only when no single shard holds enough are all shards and the
+        item's own ``quantity`` locked and drained together. Returns False,
+        taking nothing, if the stock is not there.
+        """
+        start = random.randrange(shards)
+        for i in range(shards):
+            if self.filter(
+                item_id=item_id, shard=(start + i) % shards, quantity__gte=quantity
+            ).update(quantity=F("quantity") - quantity, version=F("version") + 1):
+                return True
+
+        # Shards before the item row, the order rebalance locks them in.
+        rows = list(
+            self.filter(item_id=item_id)
+            .order_by("shard")
+            .select_for_update()
+            .values_list("shard", "quantity")
+        )
+        remainder = (
+            Item.objects.filter(pk=item_id)
+            .select_for_update()
+            .values_list("quantity", flat=True)
+            .get()
+        )
+        if sum(n for _, n in rows) + remainder < quantity:
+            return False
+        taken = {}
+        for shard, available in rows:
+            if available and quantity:
+                taken[shard] = min(available, quantity)
+                quantity -= taken[shard]
+        self.filter(item_id=item_id, shard__in=taken).update(
+            quantity=F("quantity")
+            - Case(
+                *[When(shard=shard, then=Value(n)) for shard, n in taken.items()],
+                output_field=IntegerField(),
+            ),
+            version=F("version") + 1,
+        )
+        if quantity:
+            Item.objects.filter(pk=item_id).update(
+                quantity=F("quantity") - quantity,
+                version=F("version") + 1,
+                updated_at=timezone.now(),
+            )
+        return True
+
+    def give(self, item_id, quantity, shards):
+        """Return ``quantity`` of ``item_id``'s stock to a random shard."""
+        self.filter(item_id=item_id, shard=random.randrange(shards)).update(
+            quantity=F("quantity") + quantity, version=F("version") + 1
+        )
+
+
+class StockShard(models.Model):
+    """Part of a hot item's stock, kept in its own row (see
+    ``StockShardQuerySet``). Shards are numbered 0..n-1 per item and are
+    created and evened out by ``inventory.sharding.rebalance``."""
+
+    item = models.ForeignKey(Item, related_name="shards", on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(validators=[MinValueValidator(0)])
+    # Changes made through this row. A sharded item's version is its own
+    # ``version`` plus these, so takes never have to lock the item row.
+    version = models.PositiveBigIntegerField(default=0)
+
+    objects = StockShardQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["item", "shard"], name="unique_stock_shard")
+        ]
+
+    def __str__(self):
+        return f"Item {self.item_id} shard {self.shard}: {self.quantity}"
+
+
+class CartQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_active=True)
+
+
 class Cart(models.Model):
     user_id = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # At most one active cart per user; also the index behind every
+            # active-cart lookup.
+            models.UniqueConstraint(
+                fields=["user_id"],
+                condition=models.Q(is_active=True),
+                name="unique_active_cart_per_user",
+            )
+        ]
+
     def clean(self):
         if not self.user_id:
             raise ValidationError("User ID is required")
@@ -45,6 +360,76 @@ class Cart(models.Model):
         return f"Cart {self.id} for user {self.user_id}"
 
 
+class CartItemQuerySet(models.QuerySet):
+    def with_item(self):
+        """Cart lines joined with their item in a single query."""
+        return self.select_related("item").order_by("id")
+
+    def with_holds(self):
+        """Annotate ``held``: the stock reserved for the line by its cart."""
+        holds = Reservation.objects.filter(
+            cart=OuterRef("cart_id"), item=OuterRef("item_id")
+        ).values("quantity")
+        return self.annotate(held=Coalesce(Subquery(holds), 0))
+
+    def with_shards(self):
+        """Annotate ``sharded``: the item's stock held in shard rows."""
+        return self.annotate(sharded=sharded_stock(OuterRef("item_id")))
+
+    def with_totals(self):
+        """Annotate each line with exact decimal totals and change flags.
+
+        ``available`` is the stock the line can be bought from (unreserved
+        stock, including ``sharded`` stock from ``with_shards``, plus the
+        line's ``held`` units, annotated by ``with_holds``; both default to
+        0), ``line_total`` is priced at ``price_at_addition`` and
+        ``current_line_total`` at today's price for the units still available.
+        """
+        lines = self
+        if "held" not in lines.query.annotations:
+            lines = lines.annotate(held=Value(0))
+        if "sharded" not in lines.query.annotations:
+            lines = lines.annotate(sharded=Value(0))
+        return lines.annotate(
+            available=F("item__quantity") + F("sharded") + F("held"),
+            line_total=ExpressionWrapper(
+                F("price_at_addition") * F("quantity"), output_field=MONEY
+            ),
+            current_line_total=ExpressionWrapper(
+                F("item__price")
+                * Greatest(Least(F("quantity"), F("available")), Value(0)),
+                output_field=MONEY,
+            ),
+            price_changed=ExpressionWrapper(
+                ~Q(item__price=F("price_at_addition")), output_field=BooleanField()
+            ),
+            stock_changed=ExpressionWrapper(
+                Q(available__lt=F("quantity")), output_field=BooleanField()
+            ),
+        )
+
+    def _summary(self):
+        lines = self.with_totals()
+        return lines, {
+            "subtotal": Coalesce(Sum("line_total"), Value(0), output_field=MONEY),
+            "item_count": Coalesce(Sum("quantity"), 0),
+            "line_count": Count("id"),
+            "changed_lines": Count(
+                "id", filter=Q(price_changed=True) | Q(stock_changed=True)
+            ),
+        }
+
+    def summary(self):
+        """Cart totals in one aggregate query: ``subtotal`` (Decimal),
+        ``item_count`` (units), ``line_count`` and ``changed_lines``."""
+        lines, aggregates = self._summary()
+        return lines.aggregate(**aggregates)
+
+    async def asummary(self):
+        lines, aggregates = self._summary()
+        return await lines.aaggregate(**aggregates)
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
     item = models.ForeignKey(Item, on_delete=models.CASCADE)
@@ -53,6 +438,13 @@ class CartItem(models.Model):
         max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))]
     )
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "item"], name="unique_cart_item")
+        ]
+
     def clean(self):
         if self.quantity > self.item.quantity:
             raise ValidationError(
@@ -74,6 +466,39 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.item.name} in cart {self.cart.id}"
 
 
+class Reservation(models.Model):
+    """Stock held for a cart line until ``expires_at``.
+
+    Held units are taken out of ``Item.quantity`` when the hold is placed and
+    either converted by checkout or returned by the expiry sweeper.
+    """
+
+    cart = models.ForeignKey(Cart, related_name="reservations", on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "item"], name="unique_reservation")
+        ]
+        # Serves the expiry sweep, which scans holds in expiry order.
+        indexes = [models.Index(fields=["expires_at"], name="reservation_expires_idx")]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.item_id} held for cart {self.cart_id}"
+
+
+class PurchaseLogQuerySet(models.QuerySet):
+    def since(self, when):
+        """Rows purchased at or after ``when`` (all rows for None). On
+        Postgres the log is partitioned by month, and this bound lets a query
+        skip the older partitions."""
+        if when is None:
+            return self
+        return self.filter(purchased_at__gte=when)
+
+
 class PurchaseLog(models.Model):
     user_id = models.CharField(max_length=255)
     item = models.ForeignKey(Item, on_delete=models.SET_NULL, null=True)
@@ -82,6 +507,21 @@ class PurchaseLog(models.Model):
         max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal("0.01"))]
     )
     purchased_at = models.DateTimeField(auto_now_add=True)
+    # Inserting transaction on Postgres (see inventory.txids), 0 elsewhere.
+    txid = models.PositiveBigIntegerField(default=0)
+
+    objects = PurchaseLogQuerySet.as_manager()
+
+    class Meta:
+        # On Postgres the table is range-partitioned by purchased_at month
+        # (migration 0012) and its primary key is (id, purchased_at).
+        indexes = [
+            models.Index(
+                fields=["user_id", "purchased_at"], name="purchaselog_user_time_idx"
+            ),
+            models.Index(fields=["purchased_at"], name="purchaselog_time_idx"),
+            models.Index(fields=["txid", "id"], name="purchaselog_txid_idx"),
+        ]
 
     def clean(self):
         if self.quantity <= 0:
@@ -94,7 +534,120 @@ class PurchaseLog(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        if self._state.adding and not self.txid:
+            self.txid = txids.current()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user_id} purchased {self.quantity} x {self.item.name if self.item else 'deleted-item'} at {self.purchase_price}"
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255, unique=True)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class Order(models.Model):
+    QUEUED = "queued"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (COMPLETED, "Completed"), (FAILED, "Failed")]
+
+    user_id = models.CharField(max_length=255)
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="orders")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            # Purchasing a cart again while its order waits returns that order.
+            models.UniqueConstraint(
+                fields=["cart"],
+                condition=models.Q(status="queued"),
+                name="unique_queued_order_per_cart",
+            )
+        ]
+        indexes = [
+            # The worker's queue scan; stays as small as the backlog.
+            models.Index(
+                fields=["id"], condition=models.Q(status="queued"), name="order_queue_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"Order {self.id} for cart {self.cart_id}: {self.status}"
+
+
+class OutboxEvent(models.Model):
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Inserting transaction on Postgres (see inventory.txids), 0 elsewhere.
+    txid = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["txid", "id"], name="outbox_txid_idx")]
+
+    def __str__(self):
+        return f"{self.topic} #{self.id}"
+
+
+class OutboxCheckpoint(models.Model):
+    # One row per relay: the (txid, id) of the last event it delivered.
+    name = models.CharField(max_length=64, unique=True)
+    txid = models.PositiveBigIntegerField(default=0)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+
+class SalesRollup(models.Model):
+    HOUR = "hour"
+    DAY = "day"
+    PERIOD_CHOICES = [(HOUR, "Hour"), (DAY, "Day")]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    # Start of the hour or day (UTC) the sales fall in.
+    bucket = models.DateTimeField()
+    # Kept for deleted items, like PurchaseLog rows; NULL for sales of items
+    # already deleted when they were rolled up.
+    item = models.ForeignKey(
+        Item, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name="+"
+    )
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "bucket", "item"], name="unique_sales_rollup"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:00} item {self.item_id}: {self.units}"
+
+
+class RollupWatermark(models.Model):
+    # One row per rollup job: the (txid, id) of the last PurchaseLog row it
+    # counted.
+    name = models.CharField(max_length=64, unique=True)
+    txid = models.PositiveBigIntegerField(default=0)
+    position = models.PositiveBigIntegerField(default=0)
+    # No row after ``position`` was purchased before this, so the next run
+    # only has to scan the partitions from here on.
+    scan_from = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
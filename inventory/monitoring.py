@@ -0,0 +1,62 @@
+import hmac
+import ipaddress
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework import status
+
+
+def allowed(request):
+    """Whether ``request`` may read the monitoring endpoints: it comes from an
+    address in MONITORING_ALLOWED_IPS or carries the MONITORING_TOKEN bearer
+    token."""
+    token = settings.MONITORING_TOKEN
+    if token and hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    ):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.MONITORING_ALLOWED_IPS
+    )
+
+
+def monitoring_only(view):
+    """Answer 403 to requests that are not ``allowed``."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not allowed(request):
+            return JsonResponse(
+                {"success": False, "error": "Monitoring endpoints are not public"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def connection_stats():
+    """Connection reuse settings and pool counters for every database alias.
+
+    ``pool`` holds psycopg_pool's counters (pool_size, pool_available,
+    requests_waiting, ...) when DB_POOL is enabled, and is None otherwise.
+    """
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, "pool", None)
+        stats[alias] = {
+            "vendor": connection.vendor,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "health_checks": connection.settings_dict["CONN_HEALTH_CHECKS"],
+            "connected": connection.connection is not None,
+            "pool": pool.get_stats() if pool is not None else None,
+        }
+    return stats
@@ -0,0 +1,117 @@
+"""Queued checkout (``CHECKOUT_QUEUE`` mode).
+
+``purchase_cart`` only records an ``Order`` for the cart; ``process_batch``,
+run by the ``process_orders`` command, completes queued orders in batches.
+Orders are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+workers can drain the queue without waiting on each other, and a batch is
+sold with one stock UPDATE per item for all of its orders. The outcome is
+stored on the order as the response ``purchase_cart`` would have returned.
+"""
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from inventory import checkout, metrics
+from inventory.models import Order
+
+processed = metrics.counter(
+    "orders_processed_total", "Queued orders processed by outcome (completed/failed)."
+)
+
+
+def enqueue(cart):
+    """Queue ``cart`` for checkout; returns (order, created). A cart already
+    waiting in the queue returns its existing order."""
+    try:
+        with transaction.atomic():
+            return Order.objects.create(user_id=cart.user_id, cart=cart), True
+    except IntegrityError:
+        return Order.objects.get(cart=cart, status=Order.QUEUED), False
+
+
+def _purchases(lines):
+    return [(line, line.price_at_addition) for line in lines]
+
+
+def _sell(orders, lines):
+    """Complete ``orders`` and return their results ({order_id: (status, body)}).
+
+    The batch is sold together; if the combined quantities exceed the stock,
+    orders are retried one at a time, oldest first, and those that no longer
+    fit fail.
+    """
+    results = {}
+    try:
+        with transaction.atomic():
+            checkout.complete_purchases(
+                [(order.cart, _purchases(lines[order.cart_id])) for order in orders]
+            )
+    except checkout.StockUnavailable:
+        sold = []
+        for order in orders:
+            try:
+                with transaction.atomic():
+                    checkout.complete_purchase(
+                        order.cart, _purchases(lines[order.cart_id])
+                    )
+            except checkout.StockUnavailable as e:
+                results[order.pk] = (
+                    409,
+                    {
+                        "success": False,
+                        "error": "Insufficient stock",
+                        "code": "stock_unavailable",
+                        "item_ids": sorted(e.item_ids),
+                    },
+                )
+            else:
+                sold.append(order)
+        orders = sold
+    for order in orders:
+        results[order.pk] = (200, checkout.receipt_body(lines[order.cart_id]))
+    return results
+
+
+def process_batch(batch_size):
+    """Complete up to ``batch_size`` queued orders; returns how many were
+    processed. Orders locked by another worker are skipped."""
+    with transaction.atomic():
+        batch = list(
+            Order.objects.filter(status=Order.QUEUED)
+            .select_related("cart")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("id")[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        lines = checkout.load_lines_by_cart([order.cart for order in batch])
+        results, sellable = {}, []
+        for order in batch:
+            if not order.cart.is_active:
+                results[order.pk] = (
+                    404,
+                    {"success": False, "error": "No active cart found"},
+                )
+            elif changes := checkout.detect_changes(lines[order.cart_id]):
+                results[order.pk] = (
+                    409,
+                    checkout.changes_body(lines[order.cart_id], changes),
+                )
+            else:
+                sellable.append(order)
+        if sellable:
+            results.update(_sell(sellable, lines))
+
+        now = timezone.now()
+        for order in batch:
+            order.response_status, order.response_body = results[order.pk]
+            order.status = (
+                Order.COMPLETED if order.response_status == 200 else Order.FAILED
+            )
+            order.processed_at = now
+            processed.inc(result=order.status)
+        Order.objects.bulk_update(
+            batch, ["status", "response_status", "response_body", "processed_at"]
+        )
+    return len(batch)
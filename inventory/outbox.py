@@ -0,0 +1,161 @@
+"""Transactional outbox for purchase events (``OUTBOX_ENABLED`` mode).
+
+Checkout writes a "purchase.completed" ``OutboxEvent`` in the same
+transaction as the ``PurchaseLog`` rows, so an event exists exactly when the
+purchase committed. ``relay`` (run by the ``relay_outbox`` command) publishes
+events to a sink in commit-safe order (see ``inventory.txids``) and records how far it got in an
+``OutboxCheckpoint``. The checkpoint only moves after the sink accepted the
+batch, so delivery is at-least-once: consumers should de-duplicate on the
+event ``id``.
+"""
+
+import os
+import time
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from inventory import metrics, txids
+from inventory.models import OutboxCheckpoint, OutboxEvent
+from inventory.renderers import dumps
+
+EVENT_FIELDS = ("id", "topic", "payload", "created_at")
+
+published = metrics.counter(
+    "outbox_events_published_total", "Outbox events delivered, per relay."
+)
+publish_failures = metrics.counter(
+    "outbox_publish_failures_total", "Outbox batches a sink rejected, per relay."
+)
+publish_duration = metrics.histogram(
+    "outbox_publish_duration_seconds",
+    "Time a sink took to accept a batch.",
+    metrics.DURATION_BUCKETS,
+)
+
+
+def record_purchases(orders):
+    """Add one event per cart in ``orders`` ([(cart, purchases), ...], as
+    passed to ``checkout.complete_purchases``) with a single INSERT."""
+    if not settings.OUTBOX_ENABLED:
+        return
+    events, txid = [], txids.current()
+    for cart, purchases in orders:
+        items = [
+            {"item_id": line.item_id, "quantity": line.quantity, "price": str(price)}
+            for line, price in purchases
+        ]
+        total = sum(line.quantity * price for line, price in purchases)
+        events.append(
+            OutboxEvent(
+                txid=txid,
+                topic="purchase.completed",
+                payload={
+                    "user_id": cart.user_id,
+                    "cart_id": cart.pk,
+                    "items": items,
+                    "total": str(total),
+                },
+            )
+        )
+    OutboxEvent.objects.bulk_create(events)
+
+
+def encode(events):
+    return b"".join(dumps(event) + b"\n" for event in events)
+
+
+class FileSink:
+    """Appends each batch to ``target`` as NDJSON and fsyncs it."""
+
+    def __init__(self, target):
+        self.path = target
+
+    def publish(self, events):
+        with open(self.path, "ab") as f:
+            f.write(encode(events))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class HttpSink:
+    """POSTs each batch as NDJSON to the URL ``target``; an error response
+    fails the batch."""
+
+    def __init__(self, target, timeout=10):
+        self.url = target
+        self.timeout = timeout
+
+    def publish(self, events):
+        request = urllib.request.Request(
+            self.url,
+            data=encode(events),
+            headers={"Content-Type": "application/x-ndjson"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+SINKS = {"file": FileSink, "http": HttpSink}
+
+
+def get_sink(name, target):
+    """The sink registered as ``name``, or the class at dotted path ``name``."""
+    sink_class = SINKS.get(name) or import_string(name)
+    return sink_class(target)
+
+
+def relay(sink, name, batch_size):
+    """Publish up to ``batch_size`` events after checkpoint ``name`` to
+    ``sink`` and advance the checkpoint; returns the number published.
+
+    The checkpoint row stays locked while the sink runs, so two relays with
+    the same name never deliver a batch twice. Events are read in
+    ``inventory.txids`` order, so one whose transaction commits late is
+    delivered after the checkpoint rather than skipped.
+    """
+    OutboxCheckpoint.objects.get_or_create(name=name)
+    with transaction.atomic():
+        checkpoint = OutboxCheckpoint.objects.select_for_update().get(name=name)
+        pending = OutboxEvent.objects.filter(
+            txids.after(checkpoint.txid, checkpoint.position)
+        )
+        finished = txids.finished()
+        if finished is not None:
+            pending = pending.filter(finished)
+        events = list(
+            pending.order_by("txid", "id").values("txid", *EVENT_FIELDS)[:batch_size]
+        )
+        if not events:
+            return 0
+        last_txid = events[-1].pop("txid")
+        for event in events[:-1]:
+            del event["txid"]
+
+        start = time.perf_counter()
+        try:
+            sink.publish(events)
+        except Exception:
+            publish_failures.inc(relay=name)
+            raise
+        publish_duration.observe(time.perf_counter() - start, relay=name)
+        checkpoint.txid, checkpoint.position = last_txid, events[-1]["id"]
+        checkpoint.save(update_fields=["txid", "position", "updated_at"])
+    published.inc(len(events), relay=name)
+    return len(events)
+
+
+def prune(before):
+    """Delete events created before ``before`` that every relay has
+    delivered; returns the number deleted."""
+    checkpoints = list(OutboxCheckpoint.objects.values_list("txid", "position"))
+    if not checkpoints:
+        return 0
+    delivered = OutboxEvent.objects.filter(created_at__lt=before)
+    for txid, position in checkpoints:
+        delivered = delivered.exclude(txids.after(txid, position))
+    deleted, _ = delivered.delete()
+    return deleted
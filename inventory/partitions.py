@@ -0,0 +1,222 @@
+"""Monthly partitions of the purchase log.
+
+On Postgres ``PurchaseLog`` is range-partitioned by ``purchased_at`` month
+(``inventory_purchaselog_YYYYMM``, UTC) with a default partition that
+catches rows outside them. ``ensure_partitions`` creates the coming months
+ahead of time, and ``archive`` writes whole months to gzipped CSV files and
+detaches and drops their partitions, which is far cheaper than deleting the
+rows. On other databases the log is a plain table and ``archive`` exports
+and deletes the rows month by month instead.
+"""
+
+import csv
+import gzip
+import io
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Min
+
+from inventory import txids
+from inventory.models import PurchaseLog, RollupWatermark
+from inventory.sales import WATERMARK
+
+TABLE = PurchaseLog._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def month_start(when):
+    return when.astimezone(dt_timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def next_month(month):
+    return month_start(month + timedelta(days=32))
+
+
+def partition_name(month):
+    return f"{TABLE}_{month:%Y%m}"
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions():
+    """Names of the log's monthly partitions, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass AND c.relname <> %s ORDER BY c.relname",
+            [TABLE, DEFAULT_PARTITION],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def _bounds(month):
+    return f"FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+
+
+def create_partition(month):
+    """Create ``month``'s partition, moving in any of its rows that landed in
+    the default partition meanwhile."""
+    name = partition_name(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        in_month = (
+            f"purchased_at >= '{month.isoformat()}' "
+            f"AND purchased_at < '{next_month(month).isoformat()}'"
+        )
+        cursor.execute(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month} LIMIT 1")
+        if cursor.fetchone() is None:
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {_bounds(month)}"
+            )
+            return
+        cursor.execute(
+            f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {_bounds(month)}"
+        )
+
+
+def ensure_partitions(now, months_ahead):
+    """Create the missing partitions from ``now``'s month through
+    ``months_ahead`` months later; returns their names."""
+    existing = set(partitions())
+    month, created = month_start(now), []
+    for _ in range(months_ahead + 1):
+        if partition_name(month) not in existing:
+            create_partition(month)
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created
+
+
+def _write_archive(path, write_rows):
+    """Write a gzipped CSV through ``write_rows(file)`` and rename it into
+    place only once it is complete and on disk."""
+    partial = f"{path}.partial"
+    with open(partial, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            write_rows(f)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+
+
+def _copy_out(table, f):
+    with connection.cursor() as cursor:
+        copy_sql = f"COPY {table} TO STDOUT WITH (FORMAT csv, HEADER)"
+        if hasattr(cursor.cursor, "copy_expert"):  # psycopg2
+            cursor.cursor.copy_expert(copy_sql, f)
+        else:
+            with cursor.cursor.copy(copy_sql) as copy:
+                for data in copy:
+                    f.write(data)
+
+
+def _count(cursor, table):
+    cursor.execute(f"SELECT count(*) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def _archive_partition(name, path):
+    """Copy the partition out, then detach and drop it; returns the number
+    of rows archived, or None if rows arrived while copying."""
+    # Reading the partition does not block inserts into the log; only the
+    # short detach at the end locks it.
+    with connection.cursor() as cursor:
+        count = _count(cursor, name)
+    _write_archive(path, lambda f: _copy_out(name, f))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        if _count(cursor, name) != count:
+            transaction.set_rollback(True)
+            return None
+        cursor.execute(f"DROP TABLE {name}")
+    return count
+
+
+def _archive_rows(month, path):
+    columns = [field.column for field in PurchaseLog._meta.concrete_fields]
+    rows = PurchaseLog.objects.filter(
+        purchased_at__gte=month, purchased_at__lt=next_month(month)
+    ).order_by("id")
+    with transaction.atomic():
+        count = 0
+
+        def write_rows(f):
+            nonlocal count
+            text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+            writer = csv.writer(text)
+            writer.writerow(columns)
+            for row in rows.values_list(*columns).iterator():
+                writer.writerow(row)
+                count += 1
+            text.flush()
+            text.detach()
+
+        _write_archive(path, write_rows)
+        rows.delete()
+    return count
+
+
+def archive(before, directory):
+    """Archive every whole month before ``before``'s month to
+    ``directory``/purchaselog_YYYYMM.csv.gz and remove it from the log.
+
+    Yields (month, path, rows) per archived month, or (month, None, 0) for a
+    month kept for a later run: one holding purchases the sales rollups have
+    not counted yet, or one written to while it was being archived.
+    """
+    os.makedirs(directory, exist_ok=True)
+    cutoff = month_start(before)
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    partitioned = is_partitioned()
+    if partitioned:
+        months = [
+            datetime.strptime(name[-6:], "%Y%m").replace(tzinfo=dt_timezone.utc)
+            for name in partitions()
+        ]
+    else:
+        bounds = PurchaseLog.objects.aggregate(oldest=Min("purchased_at"))
+        months, month = [], bounds["oldest"] and month_start(bounds["oldest"])
+        while month is not None and month < cutoff:
+            months.append(month)
+            month = next_month(month)
+
+    for month in months:
+        if month >= cutoff:
+            break
+        in_month = PurchaseLog.objects.filter(
+            purchased_at__gte=month, purchased_at__lt=next_month(month)
+        )
+        if watermark is not None and in_month.filter(
+            txids.after(watermark.txid, watermark.position)
+        ).exists():
+            yield month, None, 0
+            continue
+        path = os.path.join(directory, f"purchaselog_{month:%Y%m}.csv.gz")
+        if partitioned:
+            count = _archive_partition(partition_name(month), path)
+            if count is None:
+                yield month, None, 0
+                continue
+        elif not in_month.exists():
+            continue
+        else:
+            count = _archive_rows(month, path)
+        yield month, path, count
@@ -0,0 +1,50 @@
+"""JSON rendering backed by orjson when it is installed.
+
+``FastJSONRenderer`` produces the same compact UTF-8 output as DRF's
+``JSONRenderer`` and falls back to it (stdlib ``json``) when orjson is not
+available or the client asked for indented output.
+"""
+
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Types orjson does not handle itself (Decimal, lazy strings, querysets...)
+# and datetimes, so they are encoded exactly as DRF would encode them.
+_default = encoders.JSONEncoder().default
+
+
+def dumps(data):
+    """Serialize ``data`` to compact JSON bytes."""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    ret = orjson.dumps(
+        data,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS,
+    )
+    # Match DRF: escape U+2028/U+2029 so the output is a JavaScript subset.
+    if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+        ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028")
+        ret = ret.replace(b"\xe2\x80\xa9", b"\\u2029")
+    return ret
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        return dumps(data)
@@ -0,0 +1,151 @@
+"""Stock holds for cart lines (``CART_RESERVATIONS`` mode).
+
+Adding to a cart moves the requested units from ``Item.quantity`` into a
+``Reservation`` row, so checkout never finds them gone. Holds expire after
+``CART_RESERVATION_TTL`` seconds of cart inactivity and are returned to stock
+by ``release_expired``, run from the ``release_expired_reservations`` command.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from inventory.models import Item, Reservation
+
+
+def _per_item(quantities):
+    return Case(
+        *[When(item_id=item_id, then=Value(n)) for item_id, n in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def hold(cart, item_id, quantity):
+    """Take ``quantity`` of ``item_id`` out of stock for ``cart``.
+
+    Returns False, holding nothing, if the stock is not available.
+    """
+    return not hold_many(cart, {item_id: quantity})
+
+
+def hold_many(cart, quantities):
+    """Take ``quantities`` ({item_id: n}) out of stock for ``cart``.
+
+    Returns the ids without enough stock, in which case nothing is held.
+    Every hold of the cart gets a fresh expiry.
+    """
+    expires_at = timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+    with transaction.atomic():
+        failed = Item.objects.decrement_stock(quantities)
+        if failed:
+            return failed
+        holds = cart.reservations.filter(item_id__in=quantities)
+        # Locked so release_expired, which skips locked rows, cannot delete a
+        # hold between this read and the UPDATE below and lose the units.
+        existing = set(holds.select_for_update().values_list("item_id", flat=True))
+        if existing:
+            holds.filter(item_id__in=existing).update(
+                quantity=F("quantity") + _per_item(quantities)
+            )
+        new = [
+            Reservation(cart=cart, item_id=item_id, quantity=n, expires_at=expires_at)
+            for item_id, n in quantities.items()
+            if item_id not in existing
+        ]
+        try:
+            with transaction.atomic():
+                Reservation.objects.bulk_create(new)
+        except IntegrityError:
+            # A concurrent request for the same cart created some of them.
+            for hold in new:
+                if not holds.filter(item_id=hold.item_id).update(
+                    quantity=F("quantity") + hold.quantity
+                ):
+                    Reservation.objects.create(
+                        cart=cart,
+                        item_id=hold.item_id,
+                        quantity=hold.quantity,
+                        expires_at=expires_at,
+                    )
+        cart.reservations.update(expires_at=expires_at)
+    return []
+
+
+def consume(cart, item_ids=None):
+    """Delete the cart's holds and return them as {item_id: quantity}.
+
+    The rows are locked first so the sweeper cannot release them while they
+    are being converted.
+    """
+    holds = cart.reservations.all()
+    if item_ids is not None:
+        holds = holds.filter(item_id__in=item_ids)
+    held = defaultdict(int)
+    with transaction.atomic():
+        for item_id, quantity in holds.select_for_update().values_list(
+            "item_id", "quantity"
+        ):
+            held[item_id] += quantity
+        if held:
+            holds.delete()
+    return dict(held)
+
+
+def release(cart, item_ids=None):
+    """Return the cart's holds (or those for ``item_ids``) to stock."""
+    with transaction.atomic():
+        Item.objects.increment_stock(consume(cart, item_ids))
+
+
+def shrink(cart, quantities):
+    """Return up to ``quantities`` ({item_id: n}) of the cart's holds to stock,
+    as when a line's quantity is lowered."""
+    with transaction.atomic():
+        held = dict(
+            cart.reservations.filter(item_id__in=quantities)
+            .select_for_update()
+            .values_list("item_id", "quantity")
+        )
+        returned = {
+            item_id: min(n, quantities[item_id]) for item_id, n in held.items()
+        }
+        if not returned:
+            return
+        holds = cart.reservations.filter(item_id__in=returned)
+        holds.update(quantity=F("quantity") - _per_item(returned))
+        holds.filter(quantity__lte=0).delete()
+        Item.objects.increment_stock(returned)
+
+
+def release_expired(batch_size=5000, now=None):
+    """Return expired holds to stock, ``batch_size`` rows per transaction.
+
+    Each batch is three set-based statements: select the oldest expired ids
+    through ``reservation_expires_idx`` (skipping rows a checkout has locked),
+    one stock UPDATE for all affected items and one DELETE. Returns the
+    number of holds released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Reservation.objects.filter(expires_at__lte=now)
+                .order_by("expires_at")
+                .select_for_update(skip_locked=True)
+                .values_list("id", "item_id", "quantity")[:batch_size]
+            )
+            if not batch:
+                return released
+            quantities = defaultdict(int)
+            for _, item_id, quantity in batch:
+                quantities[item_id] += quantity
+            Item.objects.increment_stock(quantities)
+            Reservation.objects.filter(id__in=[row[0] for row in batch]).delete()
+        released += len(batch)
+        if len(batch) < batch_size:
+            return released
@@ -0,0 +1,165 @@
+"""Hourly and daily sales rollups.
+
+``roll_up`` adds the ``PurchaseLog`` rows written since its watermark to
+``SalesRollup`` (units and revenue per item per hour and per day), so the
+reports below read a few rollup rows instead of grouping the whole log.
+Rollups are maintained by the ``rollup_sales`` job rather than in the
+purchase transaction: a per-item hourly row would be updated by every
+checkout of the item and queue them on its lock.
+"""
+
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from inventory import txids
+from inventory.models import PurchaseLog, RollupWatermark, SalesRollup
+
+WATERMARK = "sales"
+LOG_FIELDS = ("id", "txid", "item_id", "quantity", "purchase_price", "purchased_at")
+# Rows are logged in roughly purchased_at order; this much slack covers
+# long-running transactions and clock skew between app servers.
+SCAN_MARGIN = timedelta(days=1)
+
+
+def hour_bucket(when):
+    return when.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(when):
+    return hour_bucket(when).replace(hour=0)
+
+
+def roll_up(batch_size):
+    """Add up to ``batch_size`` new PurchaseLog rows to the rollups and move
+    the watermark past them; returns the number of rows added.
+
+    The watermark row stays locked until commit, so concurrent runs do not
+    count a row twice. Rows are read in ``inventory.txids`` order, so one
+    whose transaction commits late is counted by a later run rather than
+    skipped. Rows after the watermark are only looked for from ``scan_from``
+    on, which keeps the scan to the latest log partitions.
+    """
+    RollupWatermark.objects.get_or_create(name=WATERMARK)
+    now = timezone.now()
+    with transaction.atomic():
+        watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+        pending = PurchaseLog.objects.since(watermark.scan_from).filter(
+            txids.after(watermark.txid, watermark.position)
+        )
+        finished = txids.finished()
+        if finished is not None:
+            pending = pending.filter(finished)
+        logs = list(pending.order_by("txid", "id").values(*LOG_FIELDS)[:batch_size])
+        if not logs:
+            return 0
+
+        totals = defaultdict(lambda: [0, 0])
+        for log in logs:
+            for period, bucket in (
+                (SalesRollup.HOUR, hour_bucket(log["purchased_at"])),
+                (SalesRollup.DAY, day_bucket(log["purchased_at"])),
+            ):
+                total = totals[period, bucket, log["item_id"]]
+                total[0] += log["quantity"]
+                total[1] += log["quantity"] * log["purchase_price"]
+        _apply(totals)
+
+        watermark.txid, watermark.position = logs[-1]["txid"], logs[-1]["id"]
+        watermark.scan_from = min(now, logs[-1]["purchased_at"]) - SCAN_MARGIN
+        watermark.save(update_fields=["txid", "position", "scan_from", "updated_at"])
+    return len(logs)
+
+
+def _apply(totals):
+    """Add ``totals`` ({(period, bucket, item_id): [units, revenue]}) to the
+    rollup rows: one read, one bulk UPDATE and one bulk INSERT."""
+    item_ids = {item_id for _, _, item_id in totals}
+    buckets = [bucket for _, bucket, _ in totals]
+    items = Q(item_id__in=item_ids - {None})
+    if None in item_ids:
+        items |= Q(item__isnull=True)
+    existing = {
+        (rollup.period, rollup.bucket, rollup.item_id): rollup
+        for rollup in SalesRollup.objects.filter(
+            items, bucket__gte=min(buckets), bucket__lte=max(buckets)
+        )
+    }
+    updated, created = [], []
+    for key, (units, revenue) in totals.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            period, bucket, item_id = key
+            created.append(
+                SalesRollup(
+                    period=period, bucket=bucket, item_id=item_id, units=units, revenue=revenue
+                )
+            )
+        else:
+            rollup.units += units
+            rollup.revenue += revenue
+            updated.append(rollup)
+    SalesRollup.objects.bulk_update(updated, ["units", "revenue"])
+    SalesRollup.objects.bulk_create(created)
+
+
+def _round_up(when, round_down, step):
+    bucket = round_down(when)
+    return bucket + step if bucket < when else bucket
+
+
+def _range(start, end):
+    """Rollup rows covering [start, end) widened to whole hours: day rows for
+    the whole days inside it and hour rows for the partial days at either
+    end."""
+    start, end = hour_bucket(start), _round_up(end, hour_bucket, timedelta(hours=1))
+    first_day = day_bucket(start)
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = max(day_bucket(end), first_day)
+    return SalesRollup.objects.filter(
+        Q(period=SalesRollup.DAY, bucket__gte=first_day, bucket__lt=last_day)
+        | Q(period=SalesRollup.HOUR, bucket__gte=start, bucket__lt=min(first_day, end))
+        | Q(period=SalesRollup.HOUR, bucket__gte=max(last_day, start), bucket__lt=end)
+    )
+
+
+def top_items(start, end, limit):
+    """The ``limit`` best-selling items by units in [start, end)."""
+    return list(
+        _range(start, end)
+        .values("item_id")
+        .annotate(name=F("item__name"), units=Sum("units"), revenue=Sum("revenue"))
+        .order_by("-units", "item_id")[:limit]
+    )
+
+
+def revenue(start, end, interval):
+    """Units and revenue per ``interval`` (hour or day) bucket overlapping
+    [start, end)."""
+    if interval == SalesRollup.DAY:
+        round_down, step = day_bucket, timedelta(days=1)
+    else:
+        round_down, step = hour_bucket, timedelta(hours=1)
+    return list(
+        SalesRollup.objects.filter(
+            period=interval,
+            bucket__gte=round_down(start),
+            bucket__lt=_round_up(end, round_down, step),
+        )
+        .values("bucket")
+        .annotate(units=Sum("units"), revenue=Sum("revenue"))
+        .order_by("bucket")
+    )
+
+
+def rolled_up_through():
+    """The id of the last PurchaseLog row the rollups counted, and when they
+    were updated."""
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    if watermark is None:
+        return 0, None
+    return watermark.position, watermark.updated_at
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from inventory.models import Item, Cart, CartItem, PurchaseLog
 from django.core.validators import MinValueValidator
@@ -7,7 +9,31 @@ class ItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = ["id", "name", "price", "quantity"]
-        extra_kwargs = {"price": {"min_value": 0.01}, "quantity": {"min_value": 0}}
+        extra_kwargs = {
+            "price": {"min_value": Decimal("0.01")},
+            "quantity": {"min_value": 0},
+        }
+
+
+ITEM_FIELDS = ItemSerializer.Meta.fields
+
+
+def item_rows_data(rows):
+    """``ItemSerializer(many=True).data`` for ``values(*ITEM_FIELDS)`` rows.
+
+    Skips per-field serializer dispatch, which dominates when listing
+    thousands of items; prices are stored with two decimals, so ``str`` gives
+    the same string DRF's DecimalField would.
+    """
+    return [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "price": str(row["price"]),
+            "quantity": row["quantity"],
+        }
+        for row in rows
+    ]
 
 
 class CartItemDetailSerializer(serializers.ModelSerializer):
@@ -94,5 +120,5 @@ class PurchaseLogSerializer(serializers.ModelSerializer):
         fields = ["id", "user_id", "item", "quantity", "purchase_price", "purchased_at"]
         extra_kwargs = {
             "quantity": {"min_value": 1},
-            "purchase_price": {"min_value": 0.01},
+            "purchase_price": {"min_value": Decimal("0.01")},
         }
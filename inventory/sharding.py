@@ -0,0 +1,74 @@
+"""Creating and evening out stock shards (``STOCK_SHARDING`` mode).
+
+Buyers drain shards unevenly, and once a shard is empty requests that land
+on it fall through to the next one. ``rebalance`` spreads an item's whole
+stock evenly over its shards again; run ``rebalance_stock_shards``
+periodically (e.g. every few seconds during a sale) to keep them level.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+from inventory.models import Item, StockShard
+
+
+def rebalance(item_id, shards=None):
+    """Spread ``item_id``'s stock evenly over ``shards`` shard rows.
+
+    ``shards`` defaults to the item's current shard count; 0 merges the
+    stock back into ``Item.quantity``. Shards and item row are locked in the
+    same order as ``StockShardQuerySet.take``'s fallback. The total stock is
+    unchanged, and so is the item's version: the shards' version counts are
+    folded into ``Item.version`` as the shards are rewritten. Returns the new
+    shard quantities.
+    """
+    with transaction.atomic():
+        rows = list(
+            StockShard.objects.filter(item_id=item_id)
+            .order_by("shard")
+            .select_for_update()
+            .values_list("shard", "quantity", "version")
+        )
+        current = {shard: n for shard, n, _ in rows}
+        shard_versions = sum(version for _, _, version in rows)
+        quantity = (
+            Item.objects.filter(pk=item_id)
+            .select_for_update()
+            .values_list("quantity", flat=True)
+            .get()
+        )
+        if shards is None:
+            shards = len(current)
+        total = quantity + sum(current.values())
+        target = [total // shards + (k < total % shards) for k in range(shards)]
+        remainder = total - sum(target)
+        if current == dict(enumerate(target)) and quantity == remainder:
+            return target
+
+        StockShard.objects.filter(item_id=item_id, shard__gte=shards).delete()
+        StockShard.objects.bulk_create(
+            [
+                StockShard(item_id=item_id, shard=shard, quantity=n)
+                for shard, n in enumerate(target)
+            ],
+            update_conflicts=True,
+            unique_fields=["item", "shard"],
+            update_fields=["quantity", "version"],
+        )
+        # The total is unchanged, so readers need no invalidation.
+        Item.objects.filter(pk=item_id).update(
+            quantity=remainder, version=F("version") + shard_versions
+        )
+    return target
+
+
+def rebalance_all():
+    """Rebalance every sharded item; returns how many there were."""
+    item_ids = list(
+        StockShard.objects.order_by("item_id")
+        .values_list("item_id", flat=True)
+        .distinct()
+    )
+    for item_id in item_ids:
+        rebalance(item_id)
+    return len(item_ids)
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with ``item_ids`` whenever Item rows change through bulk queries that
+# bypass post_save, such as Item.objects.decrement_stock().
+items_changed = Signal()
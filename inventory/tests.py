@@ -1,8 +1,59 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.db import DatabaseError, connection, transaction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (
+    AsyncClient,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from inventory.models import Item, Cart, CartItem, PurchaseLog
+from inventory.models import (
+    Item,
+    Cart,
+    CartItem,
+    PurchaseLog,
+    IdempotencyKey,
+    ItemChange,
+    Order,
+    OutboxCheckpoint,
+    OutboxEvent,
+    Reservation,
+    RollupWatermark,
+    SalesRollup,
+)
+from inventory import (
+    cart_cache,
+    idempotency,
+    orders,
+    outbox,
+    partitions,
+    reservations,
+    sales,
+    sharding,
+    txids,
+)
+from inventory.renderers import FastJSONRenderer
+from inventory.serializers import ITEM_FIELDS, ItemSerializer, item_rows_data
 from decimal import Decimal, ROUND_HALF_UP
 
 
@@ -212,3 +263,1560 @@ class CartSystemTests(TestCase):
         cart = Cart.objects.get(user_id=self.user_id)
         self.assertEqual(cart.items.count(), 1)
         self.assertEqual(cart.items.first().item.id, self.item2.id)
+
+
+class CartQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user_id = "query_count_user"
+        self.cart = Cart.objects.create(user_id=self.user_id)
+
+    def fill_cart(self, lines, cart=None):
+        cart = cart or self.cart
+        for i in range(lines):
+            item = Item.objects.create(
+                name=f"Item {i}", price=Decimal("2.50"), quantity=10
+            )
+            CartItem.objects.create(
+                cart=cart, item=item, quantity=1, price_at_addition=item.price
+            )
+
+    def count_view_cart_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("view-cart", args=[self.user_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response
+
+    def test_view_cart_query_count_is_constant(self):
+        """view_cart must not issue a query per cart line"""
+        self.fill_cart(1)
+        small_count, _ = self.count_view_cart_queries()
+
+        self.fill_cart(49)
+        large_count, response = self.count_view_cart_queries()
+
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, 2)
+        self.assertEqual(len(response.data["data"]["items"]), 50)
+        self.assertEqual(response.data["data"]["totals"]["item_count"], 50)
+
+    def count_purchase_queries(self, user_id, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, {"user_id": user_id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_purchase_query_count_is_constant(self):
+        """Checkout must issue a fixed number of statements per cart"""
+        for url in (reverse("purchase-cart"), reverse("confirm-purchase")):
+            small_cart = Cart.objects.create(user_id="small_buyer")
+            large_cart = Cart.objects.create(user_id="large_buyer")
+            self.fill_cart(1, cart=small_cart)
+            self.fill_cart(30, cart=large_cart)
+
+            small_count = self.count_purchase_queries("small_buyer", url)
+            large_count = self.count_purchase_queries("large_buyer", url)
+
+            self.assertEqual(small_count, large_count)
+            self.assertEqual(
+                PurchaseLog.objects.filter(user_id="large_buyer").count(), 30
+            )
+            PurchaseLog.objects.all().delete()
+
+
+class CartTotalsTests(TestCase):
+    def setUp(self):
+        self.cart = Cart.objects.create(user_id="totals")
+        self.dime = Item.objects.create(name="Dime", price=Decimal("0.10"), quantity=9)
+        self.scarce = Item.objects.create(name="Scarce", price=Decimal("0.20"), quantity=1)
+        CartItem.objects.create(
+            cart=self.cart, item=self.dime, quantity=3, price_at_addition=Decimal("0.10")
+        )
+        CartItem.objects.create(
+            cart=self.cart, item=self.scarce, quantity=1, price_at_addition=Decimal("0.20")
+        )
+        Item.objects.filter(pk=self.scarce.pk).update(quantity=0, price=Decimal("0.25"))
+
+    def test_summary_is_exact_and_single_query(self):
+        """Totals are summed as decimals in one aggregate query"""
+        with self.assertNumQueries(1):
+            totals = self.cart.items.summary()
+
+        self.assertEqual(totals["subtotal"], Decimal("0.50"))
+        self.assertEqual(totals["item_count"], 4)
+        self.assertEqual(totals["line_count"], 2)
+        self.assertEqual(totals["changed_lines"], 1)
+
+    def test_line_annotations(self):
+        dime, scarce = self.cart.items.with_item().with_totals()
+
+        self.assertEqual(dime.line_total, Decimal("0.30"))
+        self.assertFalse(dime.price_changed or dime.stock_changed)
+        self.assertTrue(scarce.price_changed)
+        self.assertTrue(scarce.stock_changed)
+        self.assertEqual(scarce.current_line_total, Decimal("0.00"))
+
+
+@override_settings(ITEM_LIST_PAGE_SIZE=2)
+class ItemListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("item-list")
+        self.items = [
+            Item.objects.create(name=f"Item {i}", price=Decimal("3.00"), quantity=i)
+            for i in range(6)
+        ]
+
+    def test_item_list_paginates_by_cursor(self):
+        """Items are returned in id order, one page at a time"""
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(first.data["success"])
+        self.assertEqual(
+            [item["id"] for item in first.data["data"]],
+            [self.items[1].id, self.items[2].id],
+        )
+
+        second = self.client.get(self.url, {"cursor": first.data["next_cursor"]})
+        third = self.client.get(self.url, {"cursor": second.data["next_cursor"]})
+        self.assertEqual(
+            [item["id"] for item in second.data["data"]],
+            [self.items[3].id, self.items[4].id],
+        )
+        self.assertEqual([item["id"] for item in third.data["data"]], [self.items[5].id])
+        self.assertIsNone(third.data["next_cursor"])
+
+    @override_settings(CATALOGUE_CACHE_ENABLED=True)
+    def test_item_list_conditional_get(self):
+        """A matching If-None-Match returns 304 until an item changes"""
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.decrement_stock({self.items[1].id: 1})
+
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(changed.data["data"][0]["id"], self.items[2].id)
+
+    def test_uncached_etag_follows_page_content(self):
+        """Without the catalogue cache the ETag is derived from the page"""
+        etag = self.client.get(self.url)["ETag"]
+        cache.clear()
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Item.objects.decrement_stock({self.items[1].id: 1})
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+
+class RenderingTests(TestCase):
+    def test_fast_renderer_matches_drf(self):
+        """The orjson renderer produces byte-identical output to JSONRenderer"""
+        data = {
+            "price": Decimal("10.50"),
+            "when": timezone.now(),
+            "name": "caf\u00e9 \u2028",
+            "nested": [{"a": 1, "b": None, "c": 2.5}],
+            1: True,
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_item_rows_match_item_serializer(self):
+        Item.objects.create(name="Ten", price=Decimal("10.00"), quantity=1)
+        Item.objects.create(name="Cents", price=Decimal("0.05"), quantity=2)
+        items = Item.objects.order_by("id")
+
+        self.assertEqual(
+            item_rows_data(items.values(*ITEM_FIELDS)),
+            ItemSerializer(items, many=True).data,
+        )
+
+
+class ItemExportTests(TestCase):
+    def setUp(self):
+        self.items = [
+            Item.objects.create(name=f"Export {i}", price=Decimal("1.50"), quantity=i)
+            for i in range(3)
+        ]
+
+    def lines(self, response):
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_ndjson_streams_every_item(self):
+        """Out-of-stock items are exported too; chunking does not drop rows"""
+        response = self.client.get(reverse("item-export"))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in self.lines(response)]
+        self.assertEqual([row["id"] for row in rows], [i.id for i in self.items])
+        self.assertEqual(rows[0]["price"], "1.50")
+
+    def test_csv_and_since_id(self):
+        response = self.client.get(
+            reverse("item-export"), {"format": "csv", "since_id": self.items[0].id}
+        )
+
+        lines = self.lines(response)
+        self.assertEqual(lines[0], "id,name,price,quantity,updated_at")
+        self.assertEqual([int(line.split(",")[0]) for line in lines[1:]], [
+            self.items[1].id,
+            self.items[2].id,
+        ])
+
+    def test_updated_since_includes_stock_decrements(self):
+        """Bulk stock updates bump updated_at, so they show up incrementally"""
+        cutoff = timezone.now()
+        Item.objects.filter(pk__in=[i.pk for i in self.items]).update(
+            updated_at=cutoff - timedelta(hours=1)
+        )
+        Item.objects.decrement_stock({self.items[2].id: 1})
+
+        response = self.client.get(
+            reverse("item-export"), {"updated_since": cutoff.isoformat()}
+        )
+        rows = [json.loads(line) for line in self.lines(response)]
+        self.assertEqual([(row["id"], row["quantity"]) for row in rows], [
+            (self.items[2].id, 1)
+        ])
+
+    async def test_async_export(self):
+        response = await AsyncClient().get(reverse("item-export"))
+
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_rejects_bad_parameters(self):
+        response = self.client.get(reverse("item-export"), {"updated_since": "soon"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ItemChangeFeedTests(TestCase):
+    def setUp(self):
+        self.item = Item.objects.create(name="Feed", price=Decimal("2.00"), quantity=10)
+
+    def changes(self, **params):
+        response = self.client.get(reverse("item-changes"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_every_change_is_logged_with_a_new_version(self):
+        self.item.price = Decimal("2.50")
+        self.item.save()
+        Item.objects.decrement_stock({self.item.id: 3})
+        Item.objects.increment_stock({self.item.id: 1})
+
+        data = self.changes()["data"]
+        self.assertEqual(
+            [(c["item_id"], c["version"], c["price"], c["quantity"]) for c in data],
+            [
+                (self.item.id, 1, "2.00", 10),
+                (self.item.id, 2, "2.50", 10),
+                (self.item.id, 3, "2.50", 7),
+                (self.item.id, 4, "2.50", 8),
+            ],
+        )
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.version, 4)
+
+    def test_failed_decrement_logs_nothing(self):
+        Item.objects.decrement_stock({self.item.id: 11})
+        self.assertEqual(ItemChange.objects.count(), 1)
+
+    def test_pages_resume_from_token(self):
+        for _ in range(4):
+            Item.objects.decrement_stock({self.item.id: 1})
+
+        first = self.changes(limit=3)
+        self.assertTrue(first["has_more"])
+        second = self.changes(since=first["next_token"], limit=3)
+        self.assertFalse(second["has_more"])
+        self.assertEqual([c["quantity"] for c in second["data"]], [7, 6])
+        caught_up = self.changes(since=second["next_token"])
+        self.assertEqual(caught_up["data"], [])
+        self.assertEqual(caught_up["next_token"], second["next_token"])
+
+    def test_rejects_malformed_token(self):
+        for since in ("-1", "1-2-3", "abc"):
+            response = self.client.get(reverse("item-changes"), {"since": since})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_command(self):
+        ItemChange.objects.update(changed_at=timezone.now() - timedelta(days=30))
+        Item.objects.decrement_stock({self.item.id: 1})
+
+        call_command("prune_item_changes", stdout=StringIO())
+        self.assertEqual(ItemChange.objects.count(), 1)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user_id = "idempotent_user"
+        self.item = Item.objects.create(
+            name="Widget", price=Decimal("4.25"), quantity=10
+        )
+        self.client.post(
+            reverse("add-to-cart"),
+            {"user_id": self.user_id, "item_id": self.item.id, "quantity": 2},
+            format="json",
+        )
+
+    def purchase(self, key):
+        return self.client.post(
+            reverse("purchase-cart"),
+            {"user_id": self.user_id},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def assert_replayed(self):
+        first = self.purchase("key-1")
+        second = self.purchase("key-1")
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(PurchaseLog.objects.count(), 1)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 8)
+
+    def test_duplicate_purchase_replays_original_response(self):
+        """A retried purchase returns the stored response without charging twice"""
+        self.assert_replayed()
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_BACKEND="inventory.idempotency.CacheBackend")
+    def test_cache_backend_replays_original_response(self):
+        """The cache backend replays responses the same way"""
+        self.addCleanup(cache.clear)
+        self.assert_replayed()
+        self.assertEqual(IdempotencyKey.objects.count(), 0)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_in_flight_duplicate_is_rejected_after_waiting(self):
+        """A duplicate of a request still in flight does not execute again"""
+        IdempotencyKey.objects.create(key="purchase_cart:idempotent_user:key-2")
+
+        response = self.purchase("key-2")
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["code"], "duplicate_request")
+        self.assertEqual(PurchaseLog.objects.count(), 0)
+
+    def test_keys_are_scoped_per_user(self):
+        """Another user's request with the same key is not a duplicate"""
+        self.purchase("key-1")
+        self.user_id = "other_user"
+        self.client.post(
+            reverse("add-to-cart"),
+            {"user_id": self.user_id, "item_id": self.item.id, "quantity": 1},
+            format="json",
+        )
+
+        response = self.purchase("key-1")
+
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(PurchaseLog.objects.count(), 2)
+
+    def test_response_is_stored_with_the_purchase(self):
+        """If the response cannot be stored the purchase is rolled back too"""
+        with mock.patch.object(
+            idempotency.DatabaseBackend, "complete", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                self.purchase("key-3")
+
+        self.assertEqual(PurchaseLog.objects.count(), 0)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.purchase("key-3").status_code, status.HTTP_200_OK)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.item = Item.objects.create(
+            name="Async Item", price=Decimal("7.25"), quantity=4
+        )
+        self.user_id = "async_user"
+
+    async def test_async_cart_round_trip(self):
+        """Async endpoints add, show and remove cart items like the sync ones"""
+        client = AsyncClient()
+
+        added = await client.post(
+            reverse("async-add-to-cart"),
+            {"user_id": self.user_id, "item_id": self.item.id, "quantity": 2},
+            content_type="application/json",
+        )
+        self.assertEqual(added.status_code, status.HTTP_200_OK)
+        self.assertEqual(added.json()["data"]["item_total"], 14.5)
+
+        too_many = await client.post(
+            reverse("async-add-to-cart"),
+            {"user_id": self.user_id, "item_id": self.item.id, "quantity": 3},
+            content_type="application/json",
+        )
+        self.assertEqual(too_many.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(too_many.json()["error"], "Cannot add more items")
+
+        cart = await client.get(reverse("async-view-cart", args=[self.user_id]))
+        self.assertEqual(cart.status_code, status.HTTP_200_OK)
+        self.assertEqual(cart.json()["data"]["totals"]["subtotal"], 14.5)
+
+        items = await client.get(reverse("async-item-list"))
+        self.assertEqual(items.json()["data"][0]["id"], self.item.id)
+        not_modified = await client.get(
+            reverse("async-item-list"), headers={"if-none-match": items["ETag"]}
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        removed = await client.delete(
+            reverse("async-remove-from-cart"),
+            {"user_id": self.user_id, "item_id": self.item.id},
+            content_type="application/json",
+        )
+        self.assertEqual(removed.status_code, status.HTTP_200_OK)
+        self.assertFalse(await CartItem.objects.filter(item=self.item).aexists())
+
+    @override_settings(CART_RESERVATIONS=True)
+    async def test_async_add_returns_hold_when_line_write_fails(self):
+        """A failed cart line write gives back the stock the add just held"""
+        client = AsyncClient()
+        with mock.patch.object(
+            CartItem.objects, "aget_or_create", side_effect=DatabaseError("boom")
+        ):
+            response = await client.post(
+                reverse("async-add-to-cart"),
+                {"user_id": self.user_id, "item_id": self.item.id, "quantity": 2},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        await self.item.arefresh_from_db()
+        self.assertEqual(self.item.quantity, 4)
+        self.assertFalse(await Reservation.objects.aexists())
+
+    @override_settings(CART_RESERVATIONS=True)
+    async def test_async_remove_keeps_line_when_release_fails(self):
+        """Removing a line and releasing its hold succeed or fail together"""
+        client = AsyncClient()
+        line = {"user_id": self.user_id, "item_id": self.item.id}
+        await client.post(
+            reverse("async-add-to-cart"),
+            {**line, "quantity": 2},
+            content_type="application/json",
+        )
+        with mock.patch.object(
+            reservations, "release", side_effect=DatabaseError("boom")
+        ):
+            response = await client.delete(
+                reverse("async-remove-from-cart"), line, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertTrue(await CartItem.objects.filter(item=self.item).aexists())
+        self.assertTrue(await Reservation.objects.aexists())
+
+
+class DbStatsTests(TestCase):
+    def test_db_stats_reports_connection_settings(self):
+        """The monitoring endpoint exposes connection reuse and pool stats"""
+        response = APIClient().get(reverse("db-stats"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        default = response.data["data"]["default"]
+        self.assertIn("conn_max_age", default)
+        self.assertIn("pool", default)
+
+    @override_settings(MONITORING_ALLOWED_IPS=["10.0.0.0/8"], MONITORING_TOKEN="s3cret")
+    def test_monitoring_endpoints_are_restricted(self):
+        """Only allowed addresses or the bearer token may read monitoring data"""
+        client = APIClient()
+        for name in ("db-stats", "metrics"):
+            url = reverse(name)
+            outside = client.get(url, REMOTE_ADDR="203.0.113.5")
+            self.assertEqual(outside.status_code, status.HTTP_403_FORBIDDEN)
+            wrong = client.get(
+                url, REMOTE_ADDR="203.0.113.5", HTTP_AUTHORIZATION="Bearer guess"
+            )
+            self.assertEqual(wrong.status_code, status.HTTP_403_FORBIDDEN)
+            token = client.get(
+                url, REMOTE_ADDR="203.0.113.5", HTTP_AUTHORIZATION="Bearer s3cret"
+            )
+            self.assertEqual(token.status_code, status.HTTP_200_OK)
+            internal = client.get(url, REMOTE_ADDR="10.1.2.3")
+            self.assertEqual(internal.status_code, status.HTTP_200_OK)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Item.objects.create(name="A", price=Decimal("1.00"), quantity=5)
+
+    def test_server_timing_and_metrics_endpoint(self):
+        """Responses carry Server-Timing and feed the per-view histograms"""
+        client = APIClient()
+        response = client.get(reverse("item-list"))
+
+        timing = response["Server-Timing"]
+        for name in ("db;dur=", "app;dur=", "render;dur=", "total;dur="):
+            self.assertIn(name, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+        response = client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="item-list"}', body)
+        self.assertIn('http_request_db_queries_bucket{view="item-list",le="+Inf"}', body)
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_metrics_skip_middleware(self):
+        """With metrics disabled the middleware is not loaded at all"""
+        response = APIClient().get(reverse("item-list"))
+
+        self.assertNotIn("Server-Timing", response)
+
+
+@override_settings(CART_CACHE_ENABLED=True)
+class CartCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.item = Item.objects.create(name="Cached", price=Decimal("4.00"), quantity=5)
+        self.other = Item.objects.create(name="Other", price=Decimal("1.00"), quantity=5)
+        self.add(self.item, 2)
+        self.url = reverse("view-cart", args=["cache-user"])
+
+    def add(self, item, quantity=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add-to-cart"),
+                {"user_id": "cache-user", "item_id": item.id, "quantity": quantity},
+                format="json",
+            )
+
+    def view(self):
+        return self.client.get(self.url).data["data"]
+
+    def test_repeated_views_are_served_from_cache(self):
+        self.view()
+        with self.assertNumQueries(0):
+            data = self.view()
+        self.assertEqual(data["items"][0]["quantity"], 2)
+        # Changes to items outside the cart keep the snapshot.
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.decrement_stock({self.other.id: 1})
+        with self.assertNumQueries(0):
+            self.view()
+
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertRegex(body, r'cart_cache_requests_total\{result="hit"\} [1-9]')
+
+    def test_cart_writes_invalidate(self):
+        self.view()
+        self.add(self.other)
+
+        self.assertEqual(len(self.view()["items"]), 2)
+
+    def test_item_changes_keep_warnings_correct(self):
+        self.view()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.price = Decimal("5.00")
+            self.item.save()
+        self.assertEqual(self.view()["warnings"][0]["type"], "price_change")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.decrement_stock({self.item.id: 4})
+        line = self.view()["items"][0]
+        self.assertTrue(line["stock_changed"])
+        self.assertEqual(line["available_quantity"], 1)
+
+    def test_purchase_invalidates(self):
+        self.view()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("purchase-cart"), {"user_id": "cache-user"}, format="json")
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_view_shares_snapshots(self):
+        url = reverse("async-view-cart", args=["cache-user"])
+        hits = cart_cache.requests.values[(("result", "hit"),)]
+        first = await AsyncClient().get(url)
+        second = await AsyncClient().get(url)
+
+        self.assertEqual(cart_cache.requests.values[(("result", "hit"),)], hits + 1)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second.json()["data"]["items"][0]["quantity"], 2)
+
+
+class DecrementStockTests(TestCase):
+    def setUp(self):
+        self.item1 = Item.objects.create(name="A", price=Decimal("1.00"), quantity=5)
+        self.item2 = Item.objects.create(name="B", price=Decimal("1.00"), quantity=1)
+
+    def test_decrement_stock_updates_all_lines(self):
+        """All lines are decremented in one guarded UPDATE"""
+        with self.assertNumQueries(4):  # savepoint, UPDATE, change log, release
+            failed = Item.objects.decrement_stock({self.item1.id: 2, self.item2.id: 1})
+
+        self.assertEqual(failed, [])
+        self.item1.refresh_from_db()
+        self.item2.refresh_from_db()
+        self.assertEqual(self.item1.quantity, 3)
+        self.assertEqual(self.item2.quantity, 0)
+
+    def test_decrement_stock_reports_failures_and_changes_nothing(self):
+        """A line without enough stock is reported and no stock is sold"""
+        failed = Item.objects.decrement_stock({self.item1.id: 2, self.item2.id: 2})
+
+        self.assertEqual(failed, [self.item2.id])
+        self.item1.refresh_from_db()
+        self.item2.refresh_from_db()
+        self.assertEqual(self.item1.quantity, 5)
+        self.assertEqual(self.item2.quantity, 1)
+
+
+@override_settings(STOCK_SHARDING=True)
+class StockShardingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hot = Item.objects.create(name="Hot", price=Decimal("9.00"), quantity=10)
+        self.cold = Item.objects.create(name="Cold", price=Decimal("1.00"), quantity=5)
+        sharding.rebalance(self.hot.id, 3)
+
+    def shards(self):
+        return list(self.hot.shards.order_by("shard").values_list("quantity", flat=True))
+
+    def stock(self, item):
+        item.refresh_from_db()
+        return item.quantity + sum(item.shards.values_list("quantity", flat=True))
+
+    def test_rebalance_splits_and_merges_stock(self):
+        self.assertEqual(self.shards(), [4, 3, 3])
+        self.assertEqual(self.stock(self.hot), 10)
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 0)
+
+        call_command(
+            "rebalance_stock_shards", item=self.hot.id, shards=0, stdout=StringIO()
+        )
+        self.assertEqual(self.shards(), [])
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 10)
+
+    def test_decrement_spans_shards_and_is_all_or_nothing(self):
+        self.assertEqual(Item.objects.decrement_stock({self.hot.id: 2, self.cold.id: 1}), [])
+        self.assertEqual(Item.objects.decrement_stock({self.hot.id: 7}), [])
+        self.assertEqual(self.stock(self.hot), 1)
+
+        self.assertEqual(
+            Item.objects.decrement_stock({self.hot.id: 2, self.cold.id: 1}), [self.hot.id]
+        )
+        self.assertEqual(self.stock(self.hot), 1)
+        self.assertEqual(self.stock(self.cold), 4)
+
+        Item.objects.increment_stock({self.hot.id: 5})
+        sharding.rebalance_all()
+        self.assertEqual(self.shards(), [2, 2, 2])
+
+    def test_reads_use_aggregate_stock(self):
+        items = self.client.get(reverse("item-list")).json()["data"]
+        self.assertEqual({i["id"]: i["quantity"] for i in items}[self.hot.id], 10)
+
+        response = APIClient().post(
+            reverse("add-to-cart"),
+            {"user_id": "flash", "item_id": self.hot.id, "quantity": 6},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cart = self.client.get(reverse("view-cart", args=["flash"])).json()["data"]
+        self.assertEqual(cart["items"][0]["available_quantity"], 10)
+        self.assertFalse(cart["items"][0]["stock_changed"])
+
+        response = APIClient().post(
+            reverse("purchase-cart"), {"user_id": "flash"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.stock(self.hot), 4)
+        self.assertEqual(ItemChange.objects.filter(item=self.hot).last().quantity, 4)
+
+    def test_feed_version_moves_with_every_shard_change(self):
+        def feed():
+            return list(
+                ItemChange.objects.filter(item=self.hot)
+                .order_by("id")
+                .values_list("version", "quantity")
+            )
+
+        def version():
+            self.hot.refresh_from_db()
+            shards = self.hot.shards.values_list("version", flat=True)
+            return self.hot.version + sum(shards)
+
+        start = len(feed())
+        Item.objects.decrement_stock({self.hot.id: 2})
+        Item.objects.decrement_stock({self.hot.id: 5})  # spans shards
+        Item.objects.increment_stock({self.hot.id: 1})
+        before = version()
+        sharding.rebalance(self.hot.id, 2)
+        self.assertEqual(version(), before)
+        self.assertEqual(len(feed()), start + 3)
+        Item.objects.decrement_stock({self.hot.id: 1})
+
+        changes = feed()[start:]
+        self.assertEqual([quantity for _, quantity in changes], [8, 3, 4, 3])
+        versions = [v for v, _ in changes]
+        self.assertEqual(versions, sorted(set(versions)))
+        self.assertEqual(versions[-1], version())
+
+    def test_export_updated_since_includes_shard_updates(self):
+        cutoff = timezone.now()
+        Item.objects.update(updated_at=cutoff - timedelta(hours=1))
+        self.assertEqual(Item.objects.decrement_stock({self.hot.id: 1}), [])
+
+        response = self.client.get(
+            reverse("item-export"), {"updated_since": cutoff.isoformat()}
+        )
+        body = b"".join(response.streaming_content)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(row["id"], row["quantity"]) for row in rows], [(self.hot.id, 9)])
+
+
+class CartSyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.items = [
+            Item.objects.create(name=f"Sync {i}", price=Decimal("2.50"), quantity=10)
+            for i in range(5)
+        ]
+        self.url = reverse("cart-sync")
+
+    def sync(self, lines, mode="add"):
+        return self.client.post(
+            self.url,
+            {"user_id": "syncer", "mode": mode, "items": lines},
+            format="json",
+        )
+
+    def test_add_mode_merges_lines_in_constant_queries(self):
+        """Many lines cost the same number of queries as one"""
+        self.sync([{"item_id": self.items[0].id, "quantity": 1}])
+        lines = [{"item_id": item.id, "quantity": 2} for item in self.items]
+
+        with CaptureQueriesContext(connection) as one:
+            self.sync(lines[:1])
+        with CaptureQueriesContext(connection) as many:
+            response = self.sync(lines)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(one), len(many))
+        quantities = dict(CartItem.objects.values_list("item_id", "quantity"))
+        self.assertEqual(quantities[self.items[0].id], 5)
+        self.assertEqual(quantities[self.items[4].id], 2)
+        self.assertEqual(response.data["data"]["totals"]["item_count"], 13)
+
+    def test_set_mode_replaces_and_removes(self):
+        self.sync([{"item_id": item.id, "quantity": 3} for item in self.items[:2]])
+        response = self.sync(
+            [
+                {"item_id": self.items[0].id, "quantity": 1},
+                {"item_id": self.items[1].id, "quantity": 0},
+            ],
+            mode="set",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(CartItem.objects.values_list("item_id", "quantity")),
+            [(self.items[0].id, 1)],
+        )
+
+    def test_rejects_whole_batch_on_stock_or_missing_item(self):
+        """A single bad line leaves the cart untouched"""
+        response = self.sync(
+            [
+                {"item_id": self.items[0].id, "quantity": 1},
+                {"item_id": self.items[1].id, "quantity": 11},
+            ]
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["unavailable"][0]["item_id"], self.items[1].id)
+
+        response = self.sync([{"item_id": 999999, "quantity": 1}])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(Cart.objects.exists())
+
+    @override_settings(CART_RESERVATIONS=True)
+    def test_reservations_follow_synced_quantities(self):
+        self.sync([{"item_id": self.items[0].id, "quantity": 6}])
+        self.sync([{"item_id": self.items[0].id, "quantity": 2}], mode="set")
+
+        self.items[0].refresh_from_db()
+        self.assertEqual(self.items[0].quantity, 8)
+        self.assertEqual(Reservation.objects.get().quantity, 2)
+
+
+@override_settings(CART_RESERVATIONS=True)
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.item = Item.objects.create(name="Held", price=Decimal("4.00"), quantity=5)
+
+    def add(self, user_id, quantity):
+        return self.client.post(
+            reverse("add-to-cart"),
+            {"user_id": user_id, "item_id": self.item.id, "quantity": quantity},
+            format="json",
+        )
+
+    def test_add_to_cart_holds_stock(self):
+        """Adding to a cart moves the units from stock into a reservation"""
+        self.assertEqual(self.add("holder", 2).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.add("holder", 1).status_code, status.HTTP_200_OK)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 2)
+        hold = Reservation.objects.get()
+        self.assertEqual(hold.quantity, 3)
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+
+        response = self.add("other", 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["available"], 2)
+
+        # Stock taken between the read and the hold is reported the same way.
+        stale = Item(id=self.item.id, name="Held", price=Decimal("4.00"), quantity=5)
+        with mock.patch("inventory.views.Item.objects.get", return_value=stale):
+            response = self.add("other", 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["available"], 2)
+
+    def test_purchase_converts_holds(self):
+        """Checkout takes held units without touching stock a second time"""
+        self.add("holder", 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("purchase-cart"), {"user_id": "holder"}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 0)
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(PurchaseLog.objects.get().quantity, 5)
+
+    def test_view_cart_counts_own_hold_as_available(self):
+        """A line fully covered by its hold is not reported as out of stock"""
+        self.add("holder", 5)
+        response = self.client.get(reverse("view-cart", args=["holder"]))
+
+        line = response.data["data"]["items"][0]
+        self.assertEqual(line["available_quantity"], 5)
+        self.assertFalse(line["stock_changed"])
+
+    def test_remove_from_cart_releases_hold(self):
+        self.add("holder", 4)
+        self.client.delete(
+            reverse("remove-from-cart"),
+            {"user_id": "holder", "item_id": self.item.id},
+            format="json",
+        )
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 5)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_expired_holds_are_released_in_bulk(self):
+        """The sweeper returns expired holds to stock and keeps live ones"""
+        self.add("expired", 2)
+        self.add("live", 1)
+        Reservation.objects.filter(cart__user_id="expired").update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        out = StringIO()
+        call_command("release_expired_reservations", batch_size=1, stdout=out)
+
+        self.assertIn("Released 1", out.getvalue())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 4)
+        self.assertEqual(Reservation.objects.get().cart.user_id, "live")
+
+
+@override_settings(CHECKOUT_QUEUE=True)
+class CheckoutQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.item = Item.objects.create(name="Item", price=Decimal("5.00"), quantity=3)
+        for user_id in ("user_1", "user_2"):
+            cart = Cart.objects.create(user_id=user_id)
+            CartItem.objects.create(
+                cart=cart, item=self.item, quantity=2, price_at_addition=self.item.price
+            )
+
+    def purchase(self, user_id):
+        return self.client.post(reverse("purchase-cart"), {"user_id": user_id}, format="json")
+
+    def order_status(self, order_id):
+        return self.client.get(reverse("order-status", args=[order_id])).json()["order"]
+
+    def test_purchase_queues_one_order_per_cart(self):
+        response = self.purchase("user_1")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        order_id = response.json()["order_id"]
+        self.assertEqual(self.purchase("user_1").json()["order_id"], order_id)
+        self.assertEqual(self.order_status(order_id)["status"], Order.QUEUED)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 3)
+
+    def test_worker_completes_orders_in_queue_order(self):
+        first = self.purchase("user_1").json()["order_id"]
+        second = self.purchase("user_2").json()["order_id"]
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("process_orders", once=True, stdout=StringIO())
+
+        completed = self.order_status(first)
+        self.assertEqual(completed["status"], Order.COMPLETED)
+        self.assertEqual(completed["result_status"], 200)
+        self.assertEqual(completed["result"]["purchase_total"], 10.0)
+        failed = self.order_status(second)
+        self.assertEqual(failed["status"], Order.FAILED)
+        self.assertEqual(failed["result_status"], 409)
+        self.assertEqual(failed["result"]["code"], "stock_unavailable")
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 1)
+        self.assertEqual(PurchaseLog.objects.count(), 1)
+        self.assertFalse(Cart.objects.get(user_id="user_1").is_active)
+        self.assertTrue(Cart.objects.get(user_id="user_2").is_active)
+
+    def test_batch_sells_each_item_with_one_update(self):
+        self.item.quantity = 10
+        self.item.save()
+        for user_id in ("user_1", "user_2"):
+            self.purchase(user_id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(orders.process_batch(10), 2)
+        updates = [
+            q["sql"] for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "inventory_item"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 6)
+        self.assertEqual(Order.objects.filter(status=Order.COMPLETED).count(), 2)
+
+    def test_changed_cart_fails_with_changes(self):
+        order_id = self.purchase("user_1").json()["order_id"]
+        self.item.price = Decimal("6.00")
+        self.item.save()
+        orders.process_batch(10)
+        order = self.order_status(order_id)
+        self.assertEqual(order["result_status"], 409)
+        self.assertEqual(order["result"]["code"], "cart_changes_detected")
+
+    def test_unknown_order(self):
+        response = self.client.get(reverse("order-status", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+@override_settings(CHECKOUT_QUEUE=True)
+class CheckoutQueueLockingTests(TransactionTestCase):
+    def test_workers_skip_orders_locked_by_another_worker(self):
+        item = Item.objects.create(name="Item", price=Decimal("5.00"), quantity=10)
+        for user_id in ("user_1", "user_2"):
+            cart = Cart.objects.create(user_id=user_id)
+            CartItem.objects.create(
+                cart=cart, item=item, quantity=1, price_at_addition=item.price
+            )
+            orders.enqueue(cart)
+        first, second = Order.objects.order_by("id")
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_first_order():
+            try:
+                with transaction.atomic():
+                    Order.objects.select_for_update().get(pk=first.pk)
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_first_order)
+        thread.start()
+        locked.wait(5)
+        try:
+            self.assertEqual(orders.process_batch(10), 1)
+        finally:
+            release.set()
+            thread.join()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, Order.QUEUED)
+        self.assertEqual(second.status, Order.COMPLETED)
+        self.assertEqual(orders.process_batch(10), 1)
+
+
+@override_settings(OUTBOX_ENABLED=True)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.item = Item.objects.create(name="Item", price=Decimal("2.50"), quantity=10)
+        self.path = os.path.join(tempfile.mkdtemp(), "events.ndjson")
+
+    def purchase(self, user_id, quantity=2):
+        cart = Cart.objects.create(user_id=user_id)
+        CartItem.objects.create(
+            cart=cart, item=self.item, quantity=quantity, price_at_addition=self.item.price
+        )
+        response = self.client.post(reverse("purchase-cart"), {"user_id": user_id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return cart
+
+    def published(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_purchase_writes_event_with_the_purchase(self):
+        cart = self.purchase("user_1", quantity=3)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.topic, "purchase.completed")
+        self.assertEqual(
+            event.payload,
+            {
+                "user_id": "user_1",
+                "cart_id": cart.id,
+                "items": [{"item_id": self.item.id, "quantity": 3, "price": "2.50"}],
+                "total": "7.50",
+            },
+        )
+
+    def test_relay_publishes_each_event_once_per_checkpoint(self):
+        self.purchase("user_1")
+        self.purchase("user_2")
+        call_command(
+            "relay_outbox", target=self.path, once=True, batch_size=1, stdout=StringIO()
+        )
+        events = self.published()
+        self.assertEqual([e["payload"]["user_id"] for e in events], ["user_1", "user_2"])
+        self.assertEqual(OutboxCheckpoint.objects.get(name="file").position, events[-1]["id"])
+
+        self.purchase("user_3")
+        self.assertEqual(outbox.relay(outbox.FileSink(self.path), "file", 100), 1)
+        self.assertEqual(len(self.published()), 3)
+        self.assertEqual(outbox.relay(outbox.FileSink(self.path), "other", 100), 3)
+
+    def test_failed_batch_is_retried(self):
+        self.purchase("user_1")
+        sink = mock.Mock()
+        sink.publish.side_effect = OSError("sink down")
+        with self.assertRaises(OSError):
+            outbox.relay(sink, "file", 100)
+        self.assertEqual(OutboxCheckpoint.objects.get(name="file").position, 0)
+        self.assertEqual(outbox.relay(outbox.FileSink(self.path), "file", 100), 1)
+
+    def test_http_sink_posts_ndjson(self):
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                received.extend(json.loads(line) for line in body.splitlines())
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            self.purchase("user_1")
+            sink = outbox.get_sink("http", f"http://127.0.0.1:{server.server_port}/")
+            self.assertEqual(outbox.relay(sink, "http", 100), 1)
+        finally:
+            server.shutdown()
+            thread.join()
+        self.assertEqual(received[0]["topic"], "purchase.completed")
+
+    def test_prune_keeps_undelivered_events(self):
+        self.purchase("user_1")
+        outbox.relay(outbox.FileSink(self.path), "file", 100)
+        self.purchase("user_2")
+        future = timezone.now() + timedelta(days=1)
+        self.assertEqual(outbox.prune(future), 1)
+        self.assertEqual(OutboxEvent.objects.get().payload["user_id"], "user_2")
+
+    def test_disabled_by_default(self):
+        with override_settings(OUTBOX_ENABLED=False):
+            self.purchase("user_1")
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "transaction ids are Postgres only")
+class ItemChangeLateCommitTests(TransactionTestCase):
+    def test_change_committed_late_is_not_skipped(self):
+        slow = Item.objects.create(name="Slow", price=Decimal("1.00"), quantity=10)
+        fast = Item.objects.create(name="Fast", price=Decimal("1.00"), quantity=10)
+        token = self.client.get(reverse("item-changes")).json()["next_token"]
+        written, release = threading.Event(), threading.Event()
+
+        def decrement_slowly():
+            try:
+                with transaction.atomic():
+                    Item.objects.decrement_stock({slow.id: 1})
+                    written.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=decrement_slowly)
+        thread.start()
+        written.wait(5)
+        try:
+            Item.objects.decrement_stock({fast.id: 1})
+            page = self.client.get(reverse("item-changes"), {"since": token}).json()
+            self.assertEqual(page["data"], [])
+        finally:
+            release.set()
+            thread.join()
+
+        page = self.client.get(reverse("item-changes"), {"since": token}).json()
+        self.assertEqual([c["item_id"] for c in page["data"]], [slow.id, fast.id])
+
+
+@skipUnless(connection.vendor == "postgresql", "transaction ids are Postgres only")
+class OutboxLateCommitTests(TransactionTestCase):
+    def test_event_committed_late_is_not_skipped(self):
+        path = os.path.join(tempfile.mkdtemp(), "events.ndjson")
+        written, release = threading.Event(), threading.Event()
+
+        def write_slowly():
+            try:
+                with transaction.atomic():
+                    OutboxEvent.objects.create(
+                        txid=txids.current(), topic="late", payload={}
+                    )
+                    written.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=write_slowly)
+        thread.start()
+        written.wait(5)
+        try:
+            OutboxEvent.objects.create(txid=txids.current(), topic="early", payload={})
+            self.assertEqual(outbox.relay(outbox.FileSink(path), "file", 100), 0)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(outbox.relay(outbox.FileSink(path), "file", 100), 2)
+        with open(path) as f:
+            topics = [json.loads(line)["topic"] for line in f]
+        self.assertEqual(topics, ["late", "early"])
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shoe = Item.objects.create(name="Shoe", price=Decimal("5.00"), quantity=10)
+        self.sock = Item.objects.create(name="Sock", price=Decimal("1.00"), quantity=10)
+        self.log(self.shoe, 2, "2026-01-01T10:30:00Z")
+        self.log(self.shoe, 1, "2026-01-01T11:10:00Z")
+        self.log(self.sock, 5, "2026-01-02T09:00:00Z")
+
+    def log(self, item, quantity, when):
+        log = PurchaseLog.objects.create(
+            user_id="user_1", item=item, quantity=quantity, purchase_price=item.price
+        )
+        PurchaseLog.objects.filter(pk=log.pk).update(purchased_at=when)
+
+    def rollup(self, period, item, when):
+        return SalesRollup.objects.get(period=period, item=item, bucket=when)
+
+    def test_roll_up_adds_only_new_purchases(self):
+        self.assertEqual(sales.roll_up(2), 2)
+        self.assertEqual(sales.roll_up(100), 1)
+        self.assertEqual(sales.roll_up(100), 0)
+        hour = self.rollup("hour", self.shoe, "2026-01-01T10:00:00Z")
+        self.assertEqual((hour.units, hour.revenue), (2, Decimal("10.00")))
+        day = self.rollup("day", self.shoe, "2026-01-01T00:00:00Z")
+        self.assertEqual((day.units, day.revenue), (3, Decimal("15.00")))
+
+        self.log(self.shoe, 4, "2026-01-01T23:59:00Z")
+        call_command("rollup_sales", stdout=StringIO())
+        day.refresh_from_db()
+        self.assertEqual(day.units, 7)
+        self.assertEqual(
+            RollupWatermark.objects.get().position, PurchaseLog.objects.latest("id").id
+        )
+
+    def test_top_items_reads_rollups_only(self):
+        sales.roll_up(100)
+        url = reverse("sales-top-items")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                url, {"start": "2025-12-31T11:00:00Z", "end": "2026-01-02T09:30:00Z"}
+            )
+        self.assertFalse(
+            any("inventory_purchaselog" in q["sql"] for q in queries.captured_queries)
+        )
+        data = response.json()["data"]
+        self.assertEqual([row["name"] for row in data], ["Sock", "Shoe"])
+        self.assertEqual((data[1]["units"], data[1]["revenue"]), (3, 15.0))
+
+        # Partial hours are included whole; ranges off the hour mix in hour rows.
+        response = self.client.get(
+            url, {"start": "2026-01-01T11:05:00Z", "end": "2026-01-02T08:00:00Z"}
+        )
+        self.assertEqual(
+            [(row["name"], row["units"]) for row in response.json()["data"]], [("Shoe", 1)]
+        )
+
+    def test_revenue_per_interval(self):
+        sales.roll_up(100)
+        url = reverse("sales-revenue")
+        params = {"start": "2026-01-01T00:00:00Z", "end": "2026-01-03T00:00:00Z"}
+        body = self.client.get(url, params).json()
+        self.assertEqual([row["revenue"] for row in body["data"]], [15.0, 5.0])
+        self.assertEqual((body["total_units"], body["total_revenue"]), (8, 20.0))
+
+        body = self.client.get(url, {**params, "interval": "hour"}).json()
+        self.assertEqual([row["units"] for row in body["data"]], [2, 1, 5])
+
+        response = self.client.get(url, {"interval": "week"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(connection.vendor == "postgresql", "transaction ids are Postgres only")
+class SalesRollupLateCommitTests(TransactionTestCase):
+    def test_purchase_committed_late_is_counted(self):
+        item = Item.objects.create(name="Item", price=Decimal("2.00"), quantity=10)
+        written, release = threading.Event(), threading.Event()
+
+        def log(quantity):
+            PurchaseLog.objects.create(
+                user_id="user_1", item=item, quantity=quantity, purchase_price=item.price
+            )
+
+        def log_slowly():
+            try:
+                with transaction.atomic():
+                    log(1)
+                    written.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=log_slowly)
+        thread.start()
+        written.wait(5)
+        try:
+            log(2)
+            self.assertEqual(sales.roll_up(100), 0)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(sales.roll_up(100), 2)
+        self.assertEqual(
+            SalesRollup.objects.filter(period=SalesRollup.DAY).get().units, 3
+        )
+
+
+class PurchaseLogPartitionTests(TestCase):
+    def setUp(self):
+        self.item = Item.objects.create(name="Item", price=Decimal("3.00"), quantity=10)
+        self.archive_dir = tempfile.mkdtemp()
+        for when in ("2026-01-15T12:00:00Z", "2026-02-10T08:00:00Z", timezone.now()):
+            log = PurchaseLog.objects.create(
+                user_id="user_1", item=self.item, quantity=1, purchase_price=Decimal("3.00")
+            )
+            PurchaseLog.objects.filter(pk=log.pk).update(purchased_at=when)
+        self.january = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        if partitions.is_partitioned():
+            # Both months landed in the default partition.
+            partitions.create_partition(self.january)
+            partitions.create_partition(partitions.next_month(self.january))
+
+    def archive(self):
+        before = datetime(2026, 3, 5, tzinfo=dt_timezone.utc)
+        return list(partitions.archive(before, self.archive_dir))
+
+    def test_archive_exports_and_removes_old_months(self):
+        archived = self.archive()
+        self.assertEqual(
+            [(month.month, count) for month, _, count in archived], [(1, 1), (2, 1)]
+        )
+        with gzip.open(archived[0][1], "rt", newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[0]["purchased_at"][:10], "2026-01-15")
+        self.assertEqual(rows[0]["user_id"], "user_1")
+        self.assertEqual(PurchaseLog.objects.count(), 1)
+
+    def test_archive_keeps_months_not_rolled_up(self):
+        RollupWatermark.objects.create(name=sales.WATERMARK, position=0)
+        self.assertEqual([path for _, path, _ in self.archive()], [None, None])
+        self.assertEqual(PurchaseLog.objects.count(), 3)
+
+    @skipUnless(connection.vendor == "postgresql", "partitioning is Postgres only")
+    def test_partitions_are_created_ahead_and_pruned(self):
+        out = StringIO()
+        call_command("partition_purchase_log", months_ahead=6, stdout=out)
+        names = partitions.partitions()
+        self.assertIn(partitions.partition_name(partitions.next_month(self.january)), names)
+        month = partitions.month_start(timezone.now())
+        for _ in range(6):
+            month = partitions.next_month(month)
+        self.assertIn(partitions.partition_name(month), names)
+
+        plan = PurchaseLog.objects.since(timezone.now() - timedelta(days=1)).explain()
+        self.assertNotIn(partitions.partition_name(self.january), plan)
+        self.assertIn(partitions.partition_name(partitions.month_start(timezone.now())), plan)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs Postgres row locks")
+class StockLockOrderTests(TransactionTestCase):
+    def test_opposite_orders_do_not_deadlock(self):
+        """Stock updates lock items in id order, whatever order the rows are
+        stored or requested in"""
+        first = Item.objects.create(name="First", price=Decimal("1.00"), quantity=10)
+        second = Item.objects.create(name="Second", price=Decimal("1.00"), quantity=10)
+        # Rewriting the first row stores it after the second one.
+        Item.objects.filter(pk=first.pk).update(name="First again")
+        locked, go = threading.Event(), threading.Event()
+        errors = []
+
+        def run(steps):
+            try:
+                with transaction.atomic():
+                    for step in steps:
+                        step()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(
+            target=run,
+            args=(
+                [
+                    lambda: Item.objects.decrement_stock({first.id: 1}),
+                    locked.set,
+                    lambda: go.wait(5),
+                    lambda: Item.objects.decrement_stock({second.id: 1}),
+                ],
+            ),
+        )
+        holder.start()
+        locked.wait(5)
+        both = threading.Thread(
+            target=run,
+            args=([lambda: Item.objects.decrement_stock({second.id: 1, first.id: 1})],),
+        )
+        both.start()
+        time.sleep(0.5)  # let it block on the first item
+        go.set()
+        holder.join()
+        both.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            list(Item.objects.order_by("id").values_list("quantity", flat=True)), [8, 8]
+        )
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 12
+    hot_stock = 20
+
+    def setUp(self):
+        self.hot_items = [
+            Item.objects.create(
+                name=f"Hot Item {i}", price=Decimal("9.99"), quantity=self.hot_stock
+            )
+            for i in range(3)
+        ]
+        for n in range(self.buyers):
+            cart = Cart.objects.create(user_id=f"buyer_{n}")
+            # Each cart references the hot items in a different order.
+            items = list(self.hot_items)
+            random.Random(n).shuffle(items)
+            for item in items:
+                CartItem.objects.create(
+                    cart=cart, item=item, quantity=2, price_at_addition=item.price
+                )
+
+    def test_concurrent_checkouts_do_not_oversell_or_deadlock(self):
+        """Concurrent checkouts over the same hot items neither oversell nor fail"""
+        responses = []
+        barrier = threading.Barrier(self.buyers)
+
+        def buy(user_id):
+            client = APIClient()
+            try:
+                barrier.wait()
+                responses.append(
+                    client.post(
+                        reverse("purchase-cart"), {"user_id": user_id}, format="json"
+                    )
+                )
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=buy, args=(f"buyer_{n}",))
+            for n in range(self.buyers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        codes = [response.status_code for response in responses]
+        self.assertEqual(len(codes), self.buyers)
+        self.assertTrue(
+            all(code in (status.HTTP_200_OK, status.HTTP_409_CONFLICT) for code in codes),
+            codes,
+        )
+
+        completed = codes.count(status.HTTP_200_OK)
+        self.assertEqual(completed, self.hot_stock // 2)
+        for item in self.hot_items:
+            item.refresh_from_db()
+            self.assertEqual(item.quantity, self.hot_stock - 2 * completed)
+            self.assertEqual(
+                PurchaseLog.objects.filter(item=item).count(), completed
+            )
+
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentAddToCartTests(TransactionTestCase):
+    adders = 10
+
+    def setUp(self):
+        self.item = Item.objects.create(name="Hot Item", price=Decimal("9.99"), quantity=6)
+        cart = Cart.objects.create(user_id="buyer")
+        CartItem.objects.create(
+            cart=cart, item=self.item, quantity=1, price_at_addition=self.item.price
+        )
+
+    def test_concurrent_adds_to_one_line_are_not_lost(self):
+        """Concurrent adds to the same line neither lose increments nor exceed stock"""
+        responses = []
+        barrier = threading.Barrier(self.adders)
+
+        def add():
+            client = APIClient()
+            try:
+                barrier.wait()
+                responses.append(
+                    client.post(
+                        reverse("add-to-cart"),
+                        {"user_id": "buyer", "item_id": self.item.id, "quantity": 1},
+                        format="json",
+                    )
+                )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(self.adders)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        codes = [response.status_code for response in responses]
+        self.assertEqual(codes.count(status.HTTP_200_OK), 5, codes)
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), 5, codes)
+        self.assertEqual(CartItem.objects.get().quantity, 6)
+
+class LoadItemsCommandTests(TestCase):
+    rows = [
+        {"id": 1, "name": "Port Wine", "price": 869, "quantity": 7},
+        {"id": 2, "name": "Crab And Brie", "price": 43.5, "quantity": 19},
+        {"id": 3, "name": "Bad Price", "price": -1, "quantity": 4},
+    ]
+
+    def write(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def load(self, path, *args):
+        out = StringIO()
+        call_command("load_items", path, *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_load_json_in_small_chunks(self):
+        """JSON arrays are streamed and invalid rows are skipped"""
+        path = self.write(".json", json.dumps(self.rows, indent=2))
+
+        with mock.patch(
+            "inventory.management.commands.load_items.READ_CHUNK_SIZE", 7
+        ):
+            output = self.load(path, "--batch-size", "2")
+
+        self.assertIn("Loaded 2 items (1 rejected)", output)
+        self.assertEqual(
+            list(Item.objects.order_by("external_id").values_list("external_id", "price")),
+            [("1", Decimal("869.00")), ("2", Decimal("43.50"))],
+        )
+
+    def test_overlong_external_id_is_rejected(self):
+        """An id longer than the external_id column is a row error"""
+        rows = [{**self.rows[0], "id": "x" * 65}, self.rows[1]]
+        output = self.load(self.write(".json", json.dumps(rows)))
+
+        self.assertIn("Loaded 1 items (1 rejected)", output)
+        self.assertEqual(Item.objects.get().external_id, "2")
+
+    def test_fractional_quantity_is_rejected(self):
+        """JSON quantities are not truncated to whole numbers"""
+        rows = [{**self.rows[0], "quantity": 2.7}, {**self.rows[1], "quantity": 3.0}]
+        output = self.load(self.write(".jsonl", "\n".join(json.dumps(r) for r in rows)))
+
+        self.assertIn("Loaded 1 items (1 rejected)", output)
+        self.assertEqual(Item.objects.get().quantity, 3)
+
+    def test_upsert_jsonl_and_csv(self):
+        """Reloading with --upsert updates items matched by external id"""
+        self.load(self.write(".jsonl", "\n".join(json.dumps(r) for r in self.rows)))
+        self.load(
+            self.write(".csv", "id,name,price,quantity\n1,Port Wine,9.99,3\n4,New,1,1\n"),
+            "--upsert",
+        )
+
+        self.assertEqual(Item.objects.count(), 3)
+        wine = Item.objects.get(external_id="1")
+        self.assertEqual(wine.price, Decimal("9.99"))
+        self.assertEqual(wine.quantity, 3)
+        self.assertEqual(wine.version, 2)
+        self.assertEqual(
+            list(wine.changes.order_by("id").values_list("version", "price")),
+            [(1, Decimal("869.00")), (2, Decimal("9.99"))],
+        )
@@ -0,0 +1,48 @@
+"""Gap-free reading order for append-only tables.
+
+Ids come from a sequence when a row is inserted but become visible when its
+transaction commits, so a reader that checkpoints on ``id`` can move past a
+row that commits later and never see it. On Postgres, rows that record their
+inserting transaction (``txid``) are read in (txid, id) order instead,
+taking only transactions older than the reader's snapshot xmin: all of
+those have finished, so nothing can later appear behind the checkpoint.
+SQLite runs one writer at a time, so ids commit in order; txid stays 0 and
+the order is plain id order.
+"""
+
+from django.db import connection
+from django.db.models import Func, PositiveBigIntegerField, Q, Value
+
+
+class CurrentTransactionId(Func):
+    template = "pg_current_xact_id()::text::bigint"
+    output_field = PositiveBigIntegerField()
+
+
+def current():
+    """Value for a row's ``txid`` field when it is inserted."""
+    if connection.vendor == "postgresql":
+        return CurrentTransactionId()
+    return Value(0, output_field=PositiveBigIntegerField())
+
+
+def after(txid, id):
+    """Rows after the checkpoint (txid, id)."""
+    return Q(txid__gt=txid) | Q(txid=txid, id__gt=id)
+
+
+def finished():
+    """Rows whose transactions have all finished (or are the reader's own),
+    or None where every visible row qualifies."""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint, "
+            "pg_current_xact_id_if_assigned()::text::bigint"
+        )
+        xmin, own = cursor.fetchone()
+    rows = Q(txid__lt=xmin)
+    if own is not None:
+        rows |= Q(txid=own)
+    return rows
@@ -1,15 +1,31 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("items/", views.item_list, name="item-list"),
+    path("items/export/", views.export_items, name="item-export"),
+    path("items/changes/", views.item_changes, name="item-changes"),
+    path("sales/top-items/", views.sales_top_items, name="sales-top-items"),
+    path("sales/revenue/", views.sales_revenue, name="sales-revenue"),
     path("add-to-cart/", views.add_to_cart, name="add-to-cart"),
+    path("cart-sync/", views.sync_cart, name="cart-sync"),
     path("remove-from-cart/", views.remove_from_cart, name="remove-from-cart"),
     path("cart/<str:user_id>/", views.view_cart, name="view-cart"),
     path("purchase/", views.purchase_cart, name="purchase-cart"),
+    path("orders/<int:order_id>/", views.order_status, name="order-status"),
     path(
         "confirm-purchase/",
         views.confirm_purchase_with_changes,
         name="confirm-purchase",
     ),
+    path("db-stats/", views.db_stats, name="db-stats"),
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("async/items/", async_views.item_list, name="async-item-list"),
+    path("async/add-to-cart/", async_views.add_to_cart, name="async-add-to-cart"),
+    path(
+        "async/remove-from-cart/",
+        async_views.remove_from_cart,
+        name="async-remove-from-cart",
+    ),
+    path("async/cart/<str:user_id>/", async_views.view_cart, name="async-view-cart"),
 ]
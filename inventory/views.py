@@ -1,20 +1,111 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
 from django.db import transaction
-from django.core.cache import cache
+from django.db.models import F
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_http_methods
+from django.utils.http import parse_etags
 from django.core.exceptions import ValidationError
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
-from inventory.models import Item, Cart, CartItem, PurchaseLog
-from inventory.serializers import ItemSerializer, CartDetailSerializer
+from inventory import (
+    cart_cache,
+    catalogue,
+    changes,
+    checkout,
+    export,
+    metrics,
+    monitoring,
+    orders,
+    reservations,
+    sales,
+)
+from inventory.idempotency import idempotent
+from inventory.models import Item, Cart, CartItem, Order
+from inventory.serializers import ITEM_FIELDS, CartDetailSerializer, item_rows_data
+
+
+def _retry_on_conflict(view):
+    """Re-run ``view`` when its transaction hit a lock conflict or lost a stock
+    race, backing off exponentially for a bounded number of attempts."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        attempts = settings.CHECKOUT_RETRY_ATTEMPTS
+        for attempt in range(attempts):
+            try:
+                return view(request, *args, **kwargs)
+            except Exception as e:
+                if not checkout.is_transient_error(e):
+                    raise
+                if attempt + 1 < attempts:
+                    delay = settings.CHECKOUT_RETRY_BACKOFF * 2**attempt
+                    time.sleep(delay * random.uniform(0.5, 1.5))
+        return Response(
+            {
+                "success": False,
+                "error": "Too many concurrent requests, please retry",
+                "code": "conflict_retry_exhausted",
+            },
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+    return wrapper
 
 
 @api_view(["GET"])
 def item_list(request):
     try:
-        items = Item.objects.filter(quantity__gt=0).order_by("id")
-        serializer = ItemSerializer(items, many=True)
+        cursor = int(request.query_params.get("cursor", 0))
+        limit = int(request.query_params.get("limit", settings.ITEM_LIST_PAGE_SIZE))
+    except ValueError:
+        return Response(
+            {"success": False, "error": "cursor and limit must be integers"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if cursor < 0 or limit < 1:
         return Response(
-            {"success": True, "data": serializer.data}, status=status.HTTP_200_OK
+            {"success": False, "error": "cursor must be >= 0 and limit >= 1"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    limit = min(limit, settings.ITEM_LIST_MAX_PAGE_SIZE)
+
+    try:
+        def build_page():
+            # Keyset pagination: fetch one extra row to know if there is more.
+            rows = list(
+                Item.objects.in_stock()
+                .filter(id__gt=cursor)
+                .order_by("id")
+                .values(*ITEM_FIELDS)[: limit + 1]
+            )
+            has_more = len(rows) > limit
+            rows = Item.objects.add_sharded_stock(rows[:limit])
+            return {
+                "data": item_rows_data(rows),
+                "next_cursor": rows[-1]["id"] if has_more else None,
+            }
+
+        page = None if settings.CATALOGUE_CACHE_ENABLED else build_page()
+        etag = catalogue.etag(cursor, limit, page)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        if page is None:
+            page = catalogue.get_page(cursor, limit, build_page)
+        return Response(
+            {"success": True, "data": page["data"], "next_cursor": page["next_cursor"]},
+            status=status.HTTP_200_OK,
+            headers={"ETag": etag},
         )
     except Exception as e:
         return Response(
@@ -23,7 +114,186 @@ def item_list(request):
         )
 
 
+@require_http_methods(["GET"])
+def export_items(request):
+    """Stream every item as NDJSON (default) or CSV (``?format=csv``).
+
+    ``since_id`` resumes after an id; ``updated_since`` (ISO 8601) limits the
+    export to items changed since then. Timestamps are taken before commit,
+    so incremental clients should overlap windows by a few seconds.
+    """
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in export.FORMATS:
+        return JsonResponse(
+            {"success": False, "error": "format must be 'ndjson' or 'csv'"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        since_id = request.GET.get("since_id")
+        since_id = int(since_id) if since_id is not None else None
+        updated_since = request.GET.get("updated_since")
+        if updated_since is not None:
+            updated_since = parse_datetime(updated_since)
+            if updated_since is None:
+                raise ValueError
+            if timezone.is_naive(updated_since):
+                updated_since = timezone.make_aware(updated_since)
+    except ValueError:
+        return JsonResponse(
+            {
+                "success": False,
+                "error": "since_id must be an integer and updated_since an "
+                "ISO 8601 datetime",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    content_type, encode, header = export.FORMATS[fmt]
+    queryset = export.export_queryset(since_id, updated_since)
+    stream = export.astream if isinstance(request, ASGIRequest) else export.stream
+    response = StreamingHttpResponse(
+        stream(queryset, encode, header), content_type=content_type
+    )
+    if fmt == "csv":
+        response["Content-Disposition"] = 'attachment; filename="items.csv"'
+    return response
+
+
+@api_view(["GET"])
+def item_changes(request):
+    """Price and stock changes after ``since`` (a token from a previous page,
+    0 for the whole retained history), oldest first."""
+    try:
+        since = changes.parse_token(request.query_params.get("since", "0"))
+        limit = int(request.query_params.get("limit", settings.ITEM_CHANGES_PAGE_SIZE))
+    except ValueError:
+        return Response(
+            {
+                "success": False,
+                "error": "since must be a token from a previous page and limit "
+                "an integer",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if limit < 1:
+        return Response(
+            {"success": False, "error": "limit must be >= 1"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    limit = min(limit, settings.ITEM_CHANGES_MAX_PAGE_SIZE)
+
+    try:
+        data, next_token, has_more = changes.changes_since(since, limit)
+        return Response(
+            {
+                "success": True,
+                "data": data,
+                "next_token": next_token,
+                "has_more": has_more,
+            },
+            status=status.HTTP_200_OK,
+        )
+    except Exception as e:
+        return Response(
+            {"success": False, "error": "Failed to retrieve changes", "detail": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+SALES_TOP_ITEMS_LIMIT = 10
+SALES_MAX_TOP_ITEMS = 100
+
+
+def _sales_range(request):
+    """``start`` and ``end`` query parameters (ISO 8601, default: the last
+    24 hours); raises ValueError."""
+    bounds = []
+    for name in ("start", "end"):
+        value = request.query_params.get(name)
+        if value is None:
+            bounds.append(None)
+            continue
+        value = parse_datetime(value)
+        if value is None:
+            raise ValueError
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        bounds.append(value)
+    start, end = bounds
+    end = end or timezone.now()
+    return start or end - timedelta(days=1), end
+
+
+def _sales_meta():
+    position, updated_at = sales.rolled_up_through()
+    return {"rolled_up_through": position, "rolled_up_at": updated_at}
+
+
+@api_view(["GET"])
+def sales_top_items(request):
+    """Best-selling items by units in [start, end), read from the rollups."""
+    try:
+        start, end = _sales_range(request)
+        limit = int(request.query_params.get("limit", SALES_TOP_ITEMS_LIMIT))
+    except ValueError:
+        return Response(
+            {
+                "success": False,
+                "error": "start and end must be ISO 8601 datetimes and limit an integer",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    limit = max(1, min(limit, SALES_MAX_TOP_ITEMS))
+
+    rows = sales.top_items(start, end, limit)
+    for row in rows:
+        row["revenue"] = float(row["revenue"])
+    return Response(
+        {"success": True, "start": start, "end": end, "data": rows, **_sales_meta()},
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["GET"])
+def sales_revenue(request):
+    """Units and revenue per hour or day (``interval``) in [start, end), read
+    from the rollups."""
+    interval = request.query_params.get("interval", "day")
+    try:
+        if interval not in ("hour", "day"):
+            raise ValueError
+        start, end = _sales_range(request)
+    except ValueError:
+        return Response(
+            {
+                "success": False,
+                "error": "start and end must be ISO 8601 datetimes and interval "
+                "hour or day",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    rows = sales.revenue(start, end, interval)
+    total_revenue = sum((row["revenue"] for row in rows), Decimal("0.00"))
+    for row in rows:
+        row["revenue"] = float(row["revenue"])
+    return Response(
+        {
+            "success": True,
+            "interval": interval,
+            "start": start,
+            "end": end,
+            "data": rows,
+            "total_units": sum(row["units"] for row in rows),
+            "total_revenue": float(total_revenue),
+            **_sales_meta(),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
 @api_view(["POST"])
+@_retry_on_conflict
 @transaction.atomic
 def add_to_cart(request):
     required_fields = ["user_id", "item_id"]
@@ -48,7 +318,8 @@ def add_to_cart(request):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        item = Item.objects.select_for_update().get(id=item_id)
+        item = Item.objects.get(id=item_id)
+        Item.objects.add_sharded_stock([item])
 
         if item.quantity < quantity:
             return Response(
@@ -64,6 +335,21 @@ def add_to_cart(request):
         cart, _ = Cart.objects.get_or_create(
             user_id=user_id, is_active=True, defaults={"user_id": user_id}
         )
+        cart_cache.invalidate(user_id)
+
+        if settings.CART_RESERVATIONS and not reservations.hold(cart, item.id, quantity):
+            item.refresh_from_db(fields=["quantity"])
+            Item.objects.add_sharded_stock([item])
+            transaction.set_rollback(True)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Insufficient stock",
+                    "available": item.quantity,
+                    "requested": quantity,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         cart_item, created = CartItem.objects.get_or_create(
             cart=cart,
@@ -71,26 +357,31 @@ def add_to_cart(request):
             defaults={"quantity": quantity, "price_at_addition": item.price},
         )
 
-        if not created:
-            new_quantity = cart_item.quantity + quantity
-            if new_quantity > item.quantity:
+        if not created and settings.CART_RESERVATIONS:
+            # The hold above already secured the extra units.
+            cart_item.quantity += quantity
+            CartItem.objects.filter(pk=cart_item.pk).update(
+                quantity=F("quantity") + quantity
+            )
+        elif not created:
+            # One guarded UPDATE, so concurrent adds to the line cannot
+            # overwrite each other's increments.
+            added = CartItem.objects.filter(
+                pk=cart_item.pk, quantity__lte=item.quantity - quantity
+            ).update(quantity=F("quantity") + quantity)
+            cart_item.refresh_from_db(fields=["quantity"])
+            if not added:
                 return Response(
                     {
                         "success": False,
                         "error": "Cannot add more items",
-                        "available": item.quantity - cart_item.quantity,
+                        "available": max(item.quantity - cart_item.quantity, 0),
                         "requested": quantity,
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            cart_item.quantity = new_quantity
-            cart_item.save()
 
-        item_total = float(cart_item.price_at_addition) * cart_item.quantity
-        cart_items = cart.items.all()
-        cart_total = sum(
-            float(item.price_at_addition) * item.quantity for item in cart_items
-        )
+        totals = checkout.cart_summary(cart)
 
         return Response(
             {
@@ -101,9 +392,11 @@ def add_to_cart(request):
                     "item_id": item.id,
                     "quantity": cart_item.quantity,
                     "price_at_addition": float(cart_item.price_at_addition),
-                    "item_total": round(item_total, 2),
-                    "cart_total": round(cart_total, 2),
-                    "cart_item_count": cart_items.count(),
+                    "item_total": float(
+                        cart_item.price_at_addition * cart_item.quantity
+                    ),
+                    "cart_total": float(totals["subtotal"]),
+                    "cart_item_count": totals["line_count"],
                 },
             },
             status=status.HTTP_200_OK,
@@ -115,102 +408,224 @@ def add_to_cart(request):
             status=status.HTTP_404_NOT_FOUND,
         )
     except Exception as e:
+        if checkout.is_transient_error(e):
+            raise
         return Response(
             {"success": False, "error": "Failed to add item to cart", "detail": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
 
-@api_view(["GET"])
-def view_cart(request, user_id):
+def _parse_sync_lines(lines, mode):
+    """Validate cart-sync ``lines`` into {item_id: quantity}, or return an
+    error message. Repeated items are summed in add mode; in set mode the
+    last one wins."""
+    if not isinstance(lines, list) or not lines:
+        return None, "items must be a non-empty list"
+    if len(lines) > settings.CART_SYNC_MAX_LINES:
+        return None, f"At most {settings.CART_SYNC_MAX_LINES} items per request"
+    minimum = 1 if mode == "add" else 0
+    quantities = {}
+    for line in lines:
+        try:
+            item_id = int(line["item_id"])
+            quantity = int(line.get("quantity", 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None, "Each item needs an integer item_id and quantity"
+        if quantity < minimum:
+            return None, f"Quantity must be at least {minimum}"
+        if mode == "add":
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
+        else:
+            quantities[item_id] = quantity
+    return quantities, None
+
+
+@api_view(["POST"])
+@idempotent
+@_retry_on_conflict
+@transaction.atomic
+def sync_cart(request):
+    """Add (``mode=add``) or set (``mode=set``, 0 removes) many cart lines.
+
+    Reads every item in one query and writes the lines in bulk; either all
+    lines are applied or none are.
+    """
+    if "user_id" not in request.data:
+        return Response(
+            {"success": False, "error": "user_id is required"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    mode = request.data.get("mode", "add")
+    if mode not in ("add", "set"):
+        return Response(
+            {"success": False, "error": "mode must be 'add' or 'set'"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    quantities, error = _parse_sync_lines(request.data.get("items"), mode)
+    if error:
+        return Response(
+            {"success": False, "error": error}, status=status.HTTP_400_BAD_REQUEST
+        )
+
     try:
-        cart = Cart.objects.get(user_id=user_id, is_active=True)
+        items = Item.objects.in_bulk(quantities)
+        Item.objects.add_sharded_stock(list(items.values()))
+        missing = sorted(set(quantities) - set(items))
+        if missing:
+            return Response(
+                {"success": False, "error": "Item not found", "item_ids": missing},
+                status=status.HTTP_404_NOT_FOUND,
+            )
 
-        # Initialize response data
-        response_data = {
-            "success": True,
-            "data": {
-                "cart_id": cart.id,
-                "user_id": cart.user_id,
-                "items": [],
-                "totals": {"subtotal": 0.0, "item_count": 0},
-                "warnings": [],
-            },
-        }
-
-        # Process each cart item
-        for cart_item in cart.items.all():
-            item = cart_item.item
-            price_changed = item.price != cart_item.price_at_addition
-            stock_changed = item.quantity < cart_item.quantity
-
-            # Calculate item totals
-            item_total = float(cart_item.price_at_addition) * cart_item.quantity
-            current_item_total = (
-                float(item.price) * min(cart_item.quantity, item.quantity)
-                if item.quantity > 0
-                else 0
+        cart, _ = Cart.objects.get_or_create(
+            user_id=request.data["user_id"],
+            is_active=True,
+            defaults={"user_id": request.data["user_id"]},
+        )
+        cart_cache.invalidate(cart.user_id)
+        current = dict(
+            cart.items.filter(item_id__in=quantities)
+            .select_for_update()
+            .values_list("item_id", "quantity")
+        )
+        if mode == "add":
+            targets = {i: current.get(i, 0) + n for i, n in quantities.items()}
+        else:
+            targets = quantities
+        deltas = {i: n - current.get(i, 0) for i, n in targets.items()}
+
+        if settings.CART_RESERVATIONS:
+            failed = reservations.hold_many(
+                cart, {i: n for i, n in deltas.items() if n > 0}
+            )
+            if not failed:
+                reservations.shrink(cart, {i: -n for i, n in deltas.items() if n < 0})
+        else:
+            failed = sorted(i for i, n in targets.items() if n > items[i].quantity)
+        if failed:
+            stock = {
+                row["id"]: row["quantity"]
+                for row in Item.objects.add_sharded_stock(
+                    list(Item.objects.filter(id__in=failed).values("id", "quantity"))
+                )
+            }
+            transaction.set_rollback(True)
+            return Response(
+                {
+                    "success": False,
+                    "error": "Insufficient stock",
+                    "unavailable": [
+                        {"item_id": i, "requested": targets[i], "available": stock[i]}
+                        for i in failed
+                    ],
+                },
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-            # Build item data
-            item_data = {
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=cart,
+                    item_id=i,
+                    quantity=n,
+                    price_at_addition=items[i].price,
+                )
+                for i, n in targets.items()
+                if n > 0
+            ],
+            update_conflicts=True,
+            unique_fields=["cart", "item"],
+            update_fields=["quantity"],
+        )
+        removed = [i for i, n in targets.items() if n == 0 and i in current]
+        if removed:
+            cart.items.filter(item_id__in=removed).delete()
+
+        return Response(
+            {"success": True, "data": build_cart_data(cart, checkout.cart_lines(cart))},
+            status=status.HTTP_200_OK,
+        )
+
+    except Exception as e:
+        if checkout.is_transient_error(e):
+            raise
+        return Response(
+            {"success": False, "error": "Failed to sync cart", "detail": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+def build_cart_data(cart, lines):
+    """Build the view_cart payload for ``cart`` from its annotated ``lines``
+    (``checkout.cart_lines(cart)``), without further queries."""
+    data = {
+        "cart_id": cart.id,
+        "user_id": cart.user_id,
+        "items": [],
+        "totals": {"subtotal": 0.0, "item_count": 0},
+        "warnings": [],
+    }
+    subtotal = Decimal("0.00")
+
+    for cart_item in lines:
+        item = cart_item.item
+        data["items"].append(
+            {
                 "item_id": item.id,
                 "name": item.name,
                 "quantity": cart_item.quantity,
                 "price_at_addition": float(cart_item.price_at_addition),
                 "current_price": float(item.price),
-                "item_total": round(item_total, 2),
-                "current_item_total": round(current_item_total, 2),
-                "available_quantity": item.quantity,
-                "price_changed": price_changed,
-                "stock_changed": stock_changed,
+                "item_total": float(cart_item.line_total),
+                "current_item_total": float(cart_item.current_line_total),
+                "available_quantity": cart_item.available,
+                "price_changed": cart_item.price_changed,
+                "stock_changed": cart_item.stock_changed,
             }
+        )
 
-            # Add warnings if changes detected
-            if price_changed:
-                response_data["data"]["warnings"].append(
-                    {
-                        "type": "price_change",
-                        "item_id": item.id,
-                        "name": item.name,
-                        "old_price": float(cart_item.price_at_addition),
-                        "new_price": float(item.price),
-                        "difference": round(
-                            float(item.price - cart_item.price_at_addition), 2
-                        ),
-                    }
-                )
+        # Add warnings if changes detected
+        if cart_item.price_changed:
+            data["warnings"].append(
+                {
+                    "type": "price_change",
+                    "item_id": item.id,
+                    "name": item.name,
+                    "old_price": float(cart_item.price_at_addition),
+                    "new_price": float(item.price),
+                    "difference": float(item.price - cart_item.price_at_addition),
+                }
+            )
 
-            if stock_changed:
-                response_data["data"]["warnings"].append(
-                    {
-                        "type": "stock_change",
-                        "item_id": item.id,
-                        "name": item.name,
-                        "requested_quantity": cart_item.quantity,
-                        "available_quantity": item.quantity,
-                        "difference": item.quantity - cart_item.quantity,
-                    }
-                )
+        if cart_item.stock_changed:
+            data["warnings"].append(
+                {
+                    "type": "stock_change",
+                    "item_id": item.id,
+                    "name": item.name,
+                    "requested_quantity": cart_item.quantity,
+                    "available_quantity": cart_item.available,
+                    "difference": cart_item.available - cart_item.quantity,
+                }
+            )
 
-            # Add to response items
-            response_data["data"]["items"].append(item_data)
+        # Update cart totals
+        subtotal += cart_item.line_total
+        data["totals"]["item_count"] += cart_item.quantity
 
-            # Update cart totals
-            response_data["data"]["totals"]["subtotal"] += item_total
-            response_data["data"]["totals"]["item_count"] += cart_item.quantity
+    data["totals"]["subtotal"] = float(subtotal)
+    data["has_changes"] = len(data["warnings"]) > 0
+    return data
 
-        # Round totals
-        response_data["data"]["totals"]["subtotal"] = round(
-            response_data["data"]["totals"]["subtotal"], 2
-        )
 
-        # Add has_changes flag
-        response_data["data"]["has_changes"] = (
-            len(response_data["data"]["warnings"]) > 0
+@api_view(["GET"])
+def view_cart(request, user_id):
+    try:
+        data = cart_cache.get_cart_data(
+            user_id, lambda cart: build_cart_data(cart, checkout.cart_lines(cart))
         )
-
-        return Response(response_data, status=status.HTTP_200_OK)
+        return Response({"success": True, "data": data}, status=status.HTTP_200_OK)
 
     except Cart.DoesNotExist:
         return Response(
@@ -225,6 +640,8 @@ def view_cart(request, user_id):
 
 
 @api_view(["POST"])
+@idempotent
+@_retry_on_conflict
 @transaction.atomic
 def purchase_cart(request):
     if "user_id" not in request.data:
@@ -234,123 +651,83 @@ def purchase_cart(request):
         )
 
     user_id = request.data["user_id"]
-    idempotency_key = request.headers.get("Idempotency-Key")
-
-    if idempotency_key:
-        cache_key = f"purchase_{idempotency_key}"
-        if cache.get(cache_key):
-            return Response(
-                {
-                    "success": False,
-                    "error": "Duplicate request detected",
-                    "code": "duplicate_request",
-                },
-                status=status.HTTP_409_CONFLICT,
-            )
-        cache.set(cache_key, True, timeout=86400)
 
     try:
-        cart = Cart.objects.get(user_id=user_id, is_active=True)
+        cart = Cart.objects.active().get(user_id=user_id)
     except Cart.DoesNotExist:
         return Response(
             {"success": False, "error": "No active cart found"},
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    changes = []
-    for cart_item in cart.items.all():
-        item = cart_item.item
-        if item.price != cart_item.price_at_addition:
-            changes.append(
-                {
-                    "item_id": item.id,
-                    "name": item.name,
-                    "type": "price_change",
-                    "old_price": float(cart_item.price_at_addition),
-                    "new_price": float(item.price),
-                    "difference": float(item.price - cart_item.price_at_addition),
-                }
-            )
-        if item.quantity < cart_item.quantity:
-            changes.append(
-                {
-                    "item_id": item.id,
-                    "name": item.name,
-                    "type": "stock_change",
-                    "requested": cart_item.quantity,
-                    "available": item.quantity,
-                    "difference": item.quantity - cart_item.quantity,
-                }
-            )
-
-    if changes:
-        # Calculate current cart total for the response
-        cart_total = sum(
-            float(item.price_at_addition) * item.quantity for item in cart.items.all()
-        )
+    if settings.CHECKOUT_QUEUE:
+        order, _ = orders.enqueue(cart)
         return Response(
             {
-                "success": False,
-                "error": "Cart items have changed",
-                "code": "cart_changes_detected",
-                "changes": changes,
-                "requires_confirmation": True,
-                "cart_total": round(cart_total, 2),
+                "success": True,
+                "message": "Order queued",
+                "order_id": order.id,
+                "status": order.status,
+                "status_url": reverse("order-status", args=[order.id]),
             },
-            status=status.HTTP_409_CONFLICT,
+            status=status.HTTP_202_ACCEPTED,
         )
 
-    try:
-        with transaction.atomic():
-            purchased_items = []
-            purchase_total = 0.0
-
-            for cart_item in cart.items.all():
-                item = cart_item.item
-                item.quantity -= cart_item.quantity
-                item.save()
-
-                item_total = float(cart_item.price_at_addition) * cart_item.quantity
-                purchase_total += item_total
-
-                PurchaseLog.objects.create(
-                    user_id=user_id,
-                    item=item,
-                    quantity=cart_item.quantity,
-                    purchase_price=cart_item.price_at_addition,
-                )
-                purchased_items.append(
-                    {
-                        "item_id": item.id,
-                        "name": item.name,
-                        "quantity": cart_item.quantity,
-                        "price": float(cart_item.price_at_addition),
-                        "item_total": round(item_total, 2),
-                    }
-                )
+    lines = checkout.load_cart_lines(cart)
+    changes = checkout.detect_changes(lines)
 
-            cart.is_active = False
-            cart.save()
+    if changes:
+        return Response(
+            checkout.changes_body(lines, changes), status=status.HTTP_409_CONFLICT
+        )
 
-            return Response(
-                {
-                    "success": True,
-                    "message": "Purchase completed successfully",
-                    "purchased_items": purchased_items,
-                    "purchase_total": round(purchase_total, 2),
-                    "item_count": len(purchased_items),
-                },
-                status=status.HTTP_200_OK,
+    try:
+        with transaction.atomic():
+            checkout.complete_purchase(
+                cart, [(line, line.price_at_addition) for line in lines]
             )
+            return Response(checkout.receipt_body(lines), status=status.HTTP_200_OK)
 
     except Exception as e:
+        if checkout.is_transient_error(e):
+            raise
         return Response(
             {"success": False, "error": "Purchase failed", "detail": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
 
+@api_view(["GET"])
+def order_status(request, order_id):
+    """Status of an order queued by ``purchase_cart`` (CHECKOUT_QUEUE); once
+    processed, ``result`` holds the response the purchase would have given."""
+    try:
+        order = Order.objects.get(pk=order_id)
+    except Order.DoesNotExist:
+        return Response(
+            {"success": False, "error": "Order not found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return Response(
+        {
+            "success": True,
+            "order": {
+                "order_id": order.id,
+                "user_id": order.user_id,
+                "status": order.status,
+                "created_at": order.created_at,
+                "processed_at": order.processed_at,
+                "result_status": order.response_status,
+                "result": order.response_body,
+            },
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
 @api_view(["POST"])
+@idempotent
+@_retry_on_conflict
 @transaction.atomic
 def confirm_purchase_with_changes(request):
     if "user_id" not in request.data:
@@ -362,7 +739,7 @@ def confirm_purchase_with_changes(request):
     user_id = request.data["user_id"]
 
     try:
-        cart = Cart.objects.get(user_id=user_id, is_active=True)
+        cart = Cart.objects.active().get(user_id=user_id)
     except Cart.DoesNotExist:
         return Response(
             {"success": False, "error": "No active cart found"},
@@ -371,71 +748,34 @@ def confirm_purchase_with_changes(request):
 
     try:
         with transaction.atomic():
+            lines = checkout.load_cart_lines(cart)
+            lines, warnings = checkout.apply_stock_adjustments(lines)
+            checkout.complete_purchase(cart, [(line, line.item.price) for line in lines])
+
+            # Quantities may have been adjusted above, so the annotated
+            # totals are stale; Decimal arithmetic keeps these exact.
             purchased_items = []
-            warnings = []
-            purchase_total = 0.0
-
-            for cart_item in cart.items.all():
-                item = cart_item.item
-                price_changed = item.price != cart_item.price_at_addition
-
-                if item.quantity < cart_item.quantity:
-                    if item.quantity > 0:
-                        warnings.append(
-                            {
-                                "item_id": item.id,
-                                "name": item.name,
-                                "type": "quantity_adjusted",
-                                "requested": cart_item.quantity,
-                                "adjusted_to": item.quantity,
-                            }
-                        )
-                        cart_item.quantity = item.quantity
-                        cart_item.save()
-                    else:
-                        warnings.append(
-                            {
-                                "item_id": item.id,
-                                "name": item.name,
-                                "type": "item_removed",
-                                "reason": "out_of_stock",
-                            }
-                        )
-                        cart_item.delete()
-                        continue
-
-                item.quantity -= cart_item.quantity
-                item.save()
-
-                item_total = float(item.price) * cart_item.quantity
+            purchase_total = Decimal("0.00")
+            for line in lines:
+                item = line.item
+                item_total = item.price * line.quantity
                 purchase_total += item_total
-
-                PurchaseLog.objects.create(
-                    user_id=user_id,
-                    item=item,
-                    quantity=cart_item.quantity,
-                    purchase_price=item.price,
-                )
-
                 purchased_items.append(
                     {
                         "item_id": item.id,
                         "name": item.name,
-                        "quantity": cart_item.quantity,
+                        "quantity": line.quantity,
                         "price": float(item.price),
-                        "price_changed": price_changed,
-                        "item_total": round(item_total, 2),
+                        "price_changed": line.price_changed,
+                        "item_total": float(item_total),
                     }
                 )
 
-            cart.is_active = False
-            cart.save()
-
             response_data = {
                 "success": True,
                 "message": "Purchase completed with adjustments",
                 "purchased_items": purchased_items,
-                "purchase_total": round(purchase_total, 2),
+                "purchase_total": float(purchase_total),
                 "item_count": len(purchased_items),
             }
 
@@ -445,6 +785,8 @@ def confirm_purchase_with_changes(request):
             return Response(response_data, status=status.HTTP_200_OK)
 
     except Exception as e:
+        if checkout.is_transient_error(e):
+            raise
         return Response(
             {
                 "success": False,
@@ -476,6 +818,9 @@ def remove_from_cart(request):
         cart = Cart.objects.get(user_id=user_id, is_active=True)
         cart_item = CartItem.objects.get(cart=cart, item_id=item_id)
         cart_item.delete()
+        if settings.CART_RESERVATIONS:
+            reservations.release(cart, [cart_item.item_id])
+        cart_cache.invalidate(user_id)
 
         return Response(
             {"success": True, "message": "Item removed from cart"},
@@ -501,3 +846,18 @@ def remove_from_cart(request):
             },
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+
+
+@api_view(["GET"])
+@monitoring.monitoring_only
+def db_stats(request):
+    return Response(
+        {"success": True, "data": monitoring.connection_stats()},
+        status=status.HTTP_200_OK,
+    )
+
+
+@require_http_methods(["GET"])
+@monitoring.monitoring_only
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")